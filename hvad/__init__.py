@@ -1,2 +1,11 @@
 __version__ = '2.0.7'
 VERSION = tuple(int(d) for d in __version__.split("."))
+
+try:
+    import django
+except ImportError: # pragma: no cover (setup.py without django)
+    pass
+else:
+    if django.VERSION < (3, 2): # pragma: no cover
+        # Later versions find the configuration in hvad.apps by themselves
+        default_app_config = 'hvad.apps.HvadConfig'
@@ -2,9 +2,10 @@
     Part of hvad public API.
 """
 import functools
+from itertools import chain
 
 import django
-from django.contrib.admin.options import InlineModelAdmin, ModelAdmin, csrf_protect_m
+from django.contrib.admin.options import BaseModelAdmin, InlineModelAdmin, ModelAdmin, csrf_protect_m
 from django.contrib.admin.utils import flatten_fieldsets, get_deleted_objects, unquote
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import FieldDoesNotExist, PermissionDenied, ValidationError
@@ -21,7 +22,8 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _, get_language, get_language_info
 from urllib.parse import urlencode, urlparse
 
-from hvad.forms import TranslatableModelForm, translatable_inlineformset_factory, translatable_modelform_factory
+from hvad.forms import (TranslatableModelForm, translatable_inlineformset_factory,
+                        translatable_modelform_factory, FormClassCache, form_class_cache)
 from hvad.manager import TranslationQueryset
 from hvad.settings import hvad_settings
 from hvad.utils import load_translation
@@ -108,6 +110,54 @@ class TranslatableModelAdminMixin:
     def _language(self, request):
         return request.GET.get(self.query_language_key, get_language())
 
+    def get_form_cache_key(self, request):
+        """ Return a hashable key for everything in request that generated form
+            classes depend on, or None to build them on every request.
+            Default is the user and their permissions, which decide how related
+            widgets are rendered. Overriding a method that form fields are built
+            from disables caching, as it may depend on anything: formfield_for_*,
+            get_autocomplete_fields and get_field_queryset on this admin, and
+            get_ordering and has_*_permission on admins of related models.
+        """
+        if self._overrides(self, self.form_cache_hooks):
+            return None
+        opts = self.model._meta
+        for field in chain(opts.get_fields(), opts.translations_model._meta.get_fields()):
+            if field.is_relation and not field.auto_created and field.related_model:
+                related_admin = self.admin_site._registry.get(field.related_model)
+                if related_admin is not None and self._overrides(related_admin,
+                                                                 self.related_form_cache_hooks):
+                    return None
+        user = getattr(request, 'user', None)
+        if user is None or not hasattr(user, 'get_all_permissions'):
+            return None
+        if user.is_active and user.is_superuser:
+            return (user.pk, True)
+        return (user.pk, False, frozenset(user.get_all_permissions()))
+
+    # Admin methods form fields are built from, with the request
+    form_cache_hooks = ('formfield_for_dbfield', 'formfield_for_choice_field',
+                        'formfield_for_foreignkey', 'formfield_for_manytomany',
+                        'get_autocomplete_fields', 'get_field_queryset')
+    related_form_cache_hooks = ('get_ordering', 'has_add_permission', 'has_change_permission',
+                                'has_delete_permission', 'has_view_permission')
+
+    @staticmethod
+    def _overrides(admin, names):
+        """ Tell whether admin overrides any of the named BaseModelAdmin methods """
+        return any(getattr(type(admin), name) is not getattr(BaseModelAdmin, name)
+                   for name in names)
+
+    def _form_class_key(self, request, kind, language, defaults, callback):
+        """ Build the form_class_cache key of a factory call, or None """
+        if defaults.get('formfield_callback') is not callback:
+            return None     # given by caller, we cannot tell what it depends on
+        request_key = self.get_form_cache_key(request)
+        if request_key is None:
+            return None
+        options = {key: value for key, value in defaults.items() if key != 'formfield_callback'}
+        return FormClassCache.make_key(self, kind, language, request_key, options)
+
 
 # ===============================================================================
 
@@ -162,7 +212,9 @@ class TranslatableAdmin(ModelAdmin, TranslatableModelAdminMixin):
         }
         defaults.update(kwargs)
         language = self._language(request)
-        return translatable_modelform_factory(language, self.model, **defaults)
+        key = self._form_class_key(request, 'form', language, defaults, old_formfield_callback)
+        return form_class_cache.get(
+            key, lambda: translatable_modelform_factory(language, self.model, **defaults))
 
     def render_change_form(self, request, context, add=False, change=False,
                            form_url='', obj=None):
@@ -382,20 +434,24 @@ class TranslatableInlineModelAdmin(InlineModelAdmin, TranslatableModelAdminMixin
                 self.get_readonly_fields(request, obj)
         )
 
+        formfield_callback = functools.partial(self.formfield_for_dbfield, request=request)
         defaults = {
             "form": self.get_form(request, obj, fields=fields),
             "formset": self.formset,
             "fk_name": self.fk_name,
             "fields": fields,
             "exclude": exclude or None,
-            "formfield_callback": functools.partial(self.formfield_for_dbfield, request=request),
+            "formfield_callback": formfield_callback,
             "extra": self.extra,
             "max_num": self.max_num,
             "can_delete": self.can_delete,
         }
         defaults.update(kwargs)
         language = self._language(request)
-        return translatable_inlineformset_factory(language, self.parent_model, self.model, **defaults)
+        key = self._form_class_key(request, 'formset', language, defaults, formfield_callback)
+        return form_class_cache.get(
+            key, lambda: translatable_inlineformset_factory(language, self.parent_model,
+                                                            self.model, **defaults))
 
     def get_urls(self):
         urlpatterns = super(InlineModelAdmin, self).get_urls()
@@ -431,7 +487,9 @@ class TranslatableInlineModelAdmin(InlineModelAdmin, TranslatableModelAdminMixin
         }
         defaults.update(kwargs)
         language = self._language(request)
-        return translatable_modelform_factory(language, self.model, **defaults)
+        key = self._form_class_key(request, 'form', language, defaults, old_formfield_callback)
+        return form_class_cache.get(
+            key, lambda: translatable_modelform_factory(language, self.model, **defaults))
 
     def response_change(self, request, obj):
         redirect = super(TranslatableAdmin, self).response_change(request, obj)
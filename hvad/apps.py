@@ -0,0 +1,19 @@
+""" Application configuration for hvad
+    Internal use, connects hvad to Django signals and system checks.
+"""
+from django.apps import AppConfig
+from django.core import checks
+from django.test.signals import setting_changed
+
+__all__ = ('HvadConfig',)
+
+#===============================================================================
+
+class HvadConfig(AppConfig):
+    name = 'hvad'
+
+    def ready(self):
+        from hvad.collation import check_collations, update_collations
+        checks.register(check_collations, checks.Tags.compatibility)
+        update_collations()
+        setting_changed.connect(update_collations)
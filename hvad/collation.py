@@ -0,0 +1,146 @@
+""" Locale-aware ordering of translated text
+    Part of hvad public API.
+
+    Every language gets a collation named hvad_<language_code>. Languages not in
+    hvad_settings.LANGUAGES use the hvad_default collation. On PostgreSQL,
+    collations are created by the CreateCollations migration operation, using
+    ICU. On SQLite, they are registered with PyICU on every new connection
+    while USE_COLLATIONS is enabled. Without PyICU, SQLite has no collations
+    and a system check reports it.
+"""
+from django.conf import settings as djsettings
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.backends.signals import connection_created
+from django.db.models import F, Q
+from django.utils.translation import get_language
+from hvad.settings import hvad_settings
+
+try:
+    from django.db.models.functions import Collate
+except ImportError: # pragma: no cover (Django < 3.2)
+    Collate = None
+
+try:
+    import icu
+except ImportError:
+    icu = None
+
+__all__ = ('collation_name', 'collated_index')
+
+# Backends hvad collations are available on
+COLLATION_VENDORS = ('postgresql', 'sqlite')
+
+# Name of the collation used for languages that have none
+DEFAULT_COLLATION = 'hvad_default'
+
+#===============================================================================
+
+def collation_name(language_code):
+    """ Return the name of hvad's collation for a language """
+    return 'hvad_%s' % language_code
+
+
+def collated_index(field_name, language, **kwargs):
+    """ Build an index on a translated text field, sorted in the collation of
+        given language and limited to translations in that language. It serves
+        ordering on that field when USE_COLLATIONS is enabled. Keyword arguments,
+        including the mandatory index name, are passed to Index.
+    """
+    kwargs.setdefault('condition', Q(language_code=language))
+    return models.Index(Collate(F(field_name), collation_name(language)), **kwargs)
+
+#===============================================================================
+# Internal helpers
+
+def is_collatable(field):
+    """ Tell whether ordering on given field should use a language collation """
+    return (isinstance(field, (models.CharField, models.TextField)) and
+            hasattr(field.model._meta, 'shared_model') and
+            field.name != 'language_code')
+
+
+def get_collation(queryset):
+    """ Return the collation to sort translated text in a TranslationQueryset,
+        or None. Collations are only used when the queryset selects a single
+        language, on supported backends.
+    """
+    if not hvad_settings.USE_COLLATIONS or Collate is None:
+        return None
+    if queryset._language_code == 'all' or queryset._language_fallbacks:
+        return None
+    vendor = connections[queryset.db].vendor
+    if vendor not in COLLATION_VENDORS or (vendor == 'sqlite' and icu is None):
+        return None
+    language_code = queryset._language_code or get_language()
+    if language_code is None:
+        return None
+    if language_code not in dict(hvad_settings.LANGUAGES):
+        return DEFAULT_COLLATION
+    return collation_name(language_code)
+
+
+def collate_ordering(model, ordering, collation):
+    """ Rewrite order_by items sorting on translated text fields of model so
+        they use given collation. Other items are returned unchanged.
+    """
+    for item in ordering:
+        if isinstance(item, str):
+            name = item.lstrip('-')
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if field is not None and is_collatable(field):
+                expression = Collate(F(name), collation)
+                yield expression.desc() if item.startswith('-') else expression.asc()
+                continue
+        yield item
+
+#===============================================================================
+# SQLite collations
+
+def _make_comparator(language_code):
+    """ Compare strings with ICU rules for a language. Ties are broken on the
+        values themselves so that distinct values never compare equal.
+    """
+    collator = icu.Collator.createInstance(icu.Locale(language_code))
+    return lambda a, b: collator.compare(a, b) or (a > b) - (a < b)
+
+
+def register_collations(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite' and icu is not None:
+        for code, name in hvad_settings.LANGUAGES:
+            connection.connection.create_collation(collation_name(code),
+                                                   _make_comparator(code))
+        connection.connection.create_collation(DEFAULT_COLLATION, _make_comparator(''))
+
+
+def update_collations(setting=None, **kwargs):
+    """ Register collations on new connections only while USE_COLLATIONS is
+        enabled. Enabling it also registers them on open connections.
+    """
+    if setting not in (None, 'HVAD'):
+        return
+    # Read the setting directly, other hvad settings may be invalid at this point
+    if getattr(djsettings, 'HVAD', {}).get('USE_COLLATIONS', False):
+        connection_created.connect(register_collations, dispatch_uid='hvad_collations')
+        for connection in connections.all():
+            if connection.connection is not None:
+                register_collations(connection.__class__, connection)
+    else:
+        connection_created.disconnect(dispatch_uid='hvad_collations')
+
+
+def check_collations(app_configs, **kwargs):
+    """ Check that collations can be used on all configured databases """
+    errors = []
+    if hvad_settings.USE_COLLATIONS and icu is None:
+        for alias in connections:
+            if connections[alias].vendor == 'sqlite':
+                errors.append(checks.Error(
+                    'HVAD["USE_COLLATIONS"] requires PyICU on SQLite databases.',
+                    hint='Install PyICU, or disable USE_COLLATIONS.',
+                    obj=alias, id='hvad.collation.E01'))
+    return errors
@@ -1,11 +1,19 @@
 from hvad.contrib.restframework.serializers import (
-    TranslationsMixin, TranslatableModelSerializer, HyperlinkedTranslatableModelSerializer,
+    TranslationsMixin, TranslatableListSerializer, TranslatableModelSerializer, HyperlinkedTranslatableModelSerializer,
     NestedTranslationSerializer,
 )
+from hvad.contrib.restframework.filters import TranslatableFilterBackend
+from hvad.contrib.restframework.pagination import TranslatableCursorPagination
+from hvad.contrib.restframework.streaming import StreamingJSONRenderer, StreamingListModelMixin
 
 __all__ = (
     'TranslationsMixin',
+    'TranslatableListSerializer',
     'TranslatableModelSerializer',
     'HyperlinkedTranslatableModelSerializer',
     'NestedTranslationSerializer',
+    'TranslatableFilterBackend',
+    'TranslatableCursorPagination',
+    'StreamingJSONRenderer',
+    'StreamingListModelMixin',
 )
@@ -0,0 +1,123 @@
+""" Translation-aware filtering for use with django-rest-framework
+    Extension to hvad public API.
+
+    TranslatableFilterBackend   - Filter backend selecting language, filtering and ordering
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import get_language_from_request
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from hvad.manager import TranslationQueryset
+from hvad.settings import hvad_settings
+
+__all__ = (
+    'TranslatableFilterBackend',
+)
+
+#=============================================================================
+
+class TranslatableFilterBackend(BaseFilterBackend):
+    """ Filter backend for views listing translatable models.
+        - Selects the language of the view's TranslationQueryset from the
+          language query parameter, or the request's preferred language. Views
+          may set translation_fallbacks to True, or to a list of languages, to
+          use fallbacks.
+        - Filters on fields listed in the view's translation_filter_fields, a
+          dict mapping field names to allowed lookups. A list of names only
+          allows exact matches.
+        - Orders on fields listed in the view's translation_ordering_fields,
+          from a comma-separated ordering query parameter.
+        Field names may be shared or translated. Unlisted fields are ignored.
+    """
+    language_param = 'language'
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        if isinstance(queryset, TranslationQueryset):
+            queryset = queryset.language(self.get_language(request, view))
+            fallbacks = getattr(view, 'translation_fallbacks', None)
+            if fallbacks is True:
+                queryset = queryset.fallbacks()
+            elif fallbacks:
+                queryset = queryset.fallbacks(*fallbacks)
+
+        filters = self.get_filters(request, view)
+        if filters:
+            try:
+                queryset = queryset.filter(**filters)
+            except DjangoValidationError as exc:
+                raise ValidationError(exc.messages)
+            except ValueError as exc:
+                raise ValidationError([str(exc)])
+
+        ordering = self.get_ordering(request, view)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_language(self, request, view):
+        """ Return the language code to use for the request """
+        language = request.query_params.get(self.language_param)
+        if language in dict(hvad_settings.LANGUAGES):
+            return language
+        return get_language_from_request(request)
+
+    def get_filter_fields(self, view):
+        """ Return a dict mapping filterable fields to their allowed lookups """
+        fields = getattr(view, 'translation_filter_fields', None) or {}
+        if not isinstance(fields, dict):
+            fields = {name: ('exact',) for name in fields}
+        return fields
+
+    def get_filters(self, request, view):
+        """ Build filter keyword arguments from query parameters """
+        filters = {}
+        for name, lookups in self.get_filter_fields(view).items():
+            for lookup in lookups:
+                param = name if lookup == 'exact' else '%s__%s' % (name, lookup)
+                if param not in request.query_params:
+                    continue
+                value = request.query_params[param]
+                if lookup == 'in':
+                    value = value.split(',')
+                elif lookup == 'isnull':
+                    value = value.lower() in ('1', 'true', 'yes')
+                filters[param] = value
+        return filters
+
+    def get_ordering(self, request, view):
+        """ Return ordering terms from query parameters, limited to allowed fields.
+            Defaults to the view's ordering attribute.
+        """
+        allowed = getattr(view, 'translation_ordering_fields', None) or ()
+        params = request.query_params.get(self.ordering_param, '')
+        terms = [term.strip() for term in params.split(',')]
+        ordering = [term for term in terms if term and term.lstrip('-') in allowed]
+        return ordering or getattr(view, 'ordering', None) or ()
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [{
+            'name': self.language_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Language of translated fields.',
+            'schema': {'type': 'string',
+                       'enum': [code for code, name in hvad_settings.LANGUAGES]},
+        }]
+        for name, lookups in self.get_filter_fields(view).items():
+            for lookup in lookups:
+                parameters.append({
+                    'name': name if lookup == 'exact' else '%s__%s' % (name, lookup),
+                    'required': False,
+                    'in': 'query',
+                    'schema': {'type': 'string'},
+                })
+        if getattr(view, 'translation_ordering_fields', None):
+            parameters.append({
+                'name': self.ordering_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Comma-separated fields to order results by.',
+                'schema': {'type': 'string'},
+            })
+        return parameters
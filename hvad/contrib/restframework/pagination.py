@@ -0,0 +1,57 @@
+""" Translatable-model-aware pagination for use with django-rest-framework
+    Extension to hvad public API.
+
+    TranslatableCursorPagination    - Cursor pagination using keyset queries
+"""
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+from hvad.pagination import KeysetPaginator, InvalidCursor
+
+__all__ = (
+    'TranslatableCursorPagination',
+)
+
+#=============================================================================
+
+class TranslatableCursorPagination(CursorPagination):
+    """ Cursor pagination for translatable querysets.
+        Unlike CursorPagination, cursors hold the full sort key and no offset, so
+        ordering may use translated fields and need not be unique. Querysets must
+        have a language set, using language() or the default queryset setting.
+    """
+    paginator_class = KeysetPaginator
+    ordering = None     # no '-created' default, ordering must be set explicitly
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        paginator = self.paginator_class(queryset, self.page_size, ordering=self.ordering)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+
+        self.has_next = self.page.has_next()
+        self.has_previous = self.page.has_previous()
+        if self.page.has_other_pages() and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.page.next_cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.page.previous_cursor)
@@ -2,22 +2,30 @@
     Extension to hvad public API.
 
     TranslationsMixin                       - Add nested translations in a serializer
+    TranslatableListSerializer              - List serializer loading translations in batch
     TranslatableModelSerializer             - Serializer that handles translatable fields
     HyperlinkedTranslatableModelSerializer  - Hyperlinked serializer that handles translatable fields
 """
+from django.db import models
+from django.db.models import prefetch_related_objects
 from django.utils.translation import gettext_lazy as _, get_language
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SkipField
 from hvad.exceptions import WrongManager
-from hvad.utils import get_cached_translation, set_cached_translation, load_translation
+from hvad.utils import (get_cached_translation, set_cached_translation, load_translation,
+                        load_translations, get_language_bitmap_field, has_custom_save,
+                        bulk_create_translations)
 from hvad.contrib.restframework.utils import TranslationListSerializer
 from collections import OrderedDict
+from functools import lru_cache
+from weakref import WeakKeyDictionary
 from django.core.exceptions import FieldDoesNotExist
 from rest_framework.utils import model_meta
 
 __all__ = (
     'TranslationsMixin',
+    'TranslatableListSerializer',
     'TranslatableModelSerializer',
     'HyperlinkedTranslatableModelSerializer',
     'NestedTranslationSerializer',
@@ -25,6 +33,22 @@ __all__ = (
 
 veto_fields = ('id', 'master')
 
+# Nested translation serializer classes, by serializer class then (model, depth)
+nested_serializers = WeakKeyDictionary()
+
+@lru_cache(maxsize=128)
+def get_translation_fields(trans_model):
+    ''' Names of translations model fields written by nested translations:
+        concrete fields, except primary key, master and language '''
+    return frozenset(field.name for field in trans_model._meta.concrete_fields
+                     if field.name not in veto_fields + ('language_code',))
+
+@lru_cache(maxsize=128)
+def get_translations_field_info(trans_model):
+    ''' Memoized field info of a translations model, which never changes once
+        models are loaded '''
+    return model_meta.get_field_info(trans_model)
+
 #=============================================================================
 
 class NestedTranslationSerializer(serializers.ModelSerializer):
@@ -48,11 +72,43 @@ class NestedTranslationSerializer(serializers.ModelSerializer):
         return ret
 
 
+class TranslatableListSerializer(serializers.ListSerializer):
+    ''' List serializer for translatable models, used by default when serializers
+        using TranslationsMixin or TranslatableModelMixin are instantiated with
+        many=True. Before serializing, it loads translations of all instances
+        at once: all of them for nested translations, and the serializer's
+        language for translated fields.
+    '''
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        if instances:
+            self.load_translations(instances)
+        return super().to_representation(instances)
+
+    def load_translations(self, instances):
+        # Prefetch all translations for nested translation serializers
+        sources = {field.source for field in self.child._readable_fields
+                   if isinstance(field, TranslationListSerializer)}
+        for source in sources:
+            prefetch_related_objects(instances, source)
+
+        # Load the translation each instance will be serialized in
+        if isinstance(self.child, TranslatableModelMixin):
+            enforce = hasattr(self.child, 'language')
+            language = getattr(self.child, 'language', None) or get_language()
+            load_translations(instances, language, enforce)
+
+
 class TranslationsMixin:
     ''' Adds support for nested translations in a serializer
         Generated field will default to the model's translation accessor.
     '''
 
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        return use_translatable_list(super().many_init(*args, **kwargs))
+
     # Add the translations accessor to default serializer fields
     def get_default_field_names(self, *args):
         names = super().get_default_field_names(*args)
@@ -65,6 +121,15 @@ class TranslationsMixin:
     def build_field(self, field_name, info, model_class, nested_depth):
         # Special handling for translations field so it is nested and not relational
         if field_name == model_class._meta.translations_accessor:
+            kwargs = {'many': True, 'instance': self.instance}
+            if isinstance(self, TranslatableModelMixin):
+                kwargs['required'] = False
+            cache = nested_serializers.setdefault(self.__class__, {})
+            try:
+                return cache[model_class, nested_depth], kwargs
+            except KeyError:
+                pass
+
             # Create a nested serializer as a subclass of configured translations_serializer
             BaseSerializer = getattr(self.Meta, 'translations_serializer', NestedTranslationSerializer)
             BaseMeta = getattr(BaseSerializer, 'Meta', None)
@@ -79,10 +144,7 @@ class TranslationsMixin:
                 'list_serializer_class': TranslationListSerializer,
             })
             NestedSerializer = type('NestedSerializer', (BaseSerializer,), {'Meta': NestedMeta})
-
-            kwargs = {'many': True, 'instance': self.instance}
-            if isinstance(self, TranslatableModelMixin):
-                kwargs['required'] = False
+            cache[model_class, nested_depth] = NestedSerializer
             return NestedSerializer, kwargs
 
         return super().build_field(field_name, info, model_class, nested_depth)
@@ -110,63 +172,136 @@ class TranslationsMixin:
 
     def create(self, data):
         accessor = self.Meta.model._meta.translations_accessor
-        translations_data = data.pop(accessor, None)
-        instance = None
-        if translations_data:
-            for language, translation_data in translations_data.items():
-                if not isinstance(translation_data, dict):
-                    continue
-                if not instance:
-                    data.update(translation_data)
-                    data['language_code'] = language
-                    instance = super().create(data)
-                    continue
-                instance.translate(language)
-                self.update_translation(instance, translation_data)
-        if not instance:
-            instance = super().create(data)
+        translations_data = [(language, translation_data)
+                             for language, translation_data in (data.pop(accessor, None) or {}).items()
+                             if isinstance(translation_data, dict)]
+        if not translations_data:
+            return super().create(data)
+
+        language, translation_data = translations_data.pop(0)
+        data.update(translation_data)
+        data['language_code'] = language
+        instance = super().create(data)
+        self.save_translations(instance, dict(translations_data), {})
         return instance
 
     def update(self, instance, data):
         accessor = self.Meta.model._meta.translations_accessor
         translations_data = data.pop(accessor, None)
-        updated = None
-        to_delete = []
-        if translations_data:
-            for language, translation_data in translations_data.items():
-                if not isinstance(translation_data, dict):
-                    if translation_data == False:
-                        to_delete.append(language)
-                    continue
-                if not updated:
-                    data.update(translation_data)
-                    stashed = set_cached_translation(instance, load_translation(instance, language, enforce=True))
-                    updated = super().update(instance, data)
-                    continue
-                set_cached_translation(updated, load_translation(updated, language, enforce=True))
-                self.update_translation(updated, translation_data)
-        if updated:
-            set_cached_translation(updated, stashed)
-            instance = updated
+        if not translations_data:
+            return super().update(instance, data)
+
+        to_save = OrderedDict((language, translation_data)
+                              for language, translation_data in translations_data.items()
+                              if isinstance(translation_data, dict))
+        to_delete = [language for language, translation_data in translations_data.items()
+                     if not isinstance(translation_data, dict) and translation_data == False]
+        existing = self.get_existing_translations(instance)
+
+        if to_save:
+            language, translation_data = to_save.popitem(last=False)
+            translation = get_cached_translation(instance)
+            if translation is None or translation.language_code != language:
+                translation = existing.get(language)
+                if translation is None:
+                    translation = instance._meta.translations_model(language_code=language)
+            data.update(translation_data)
+            stashed = set_cached_translation(instance, translation)
+            instance = super().update(instance, data)
+            self.save_translations(instance, to_save, existing)
+            set_cached_translation(instance, stashed)
         else:
             instance = super().update(instance, data)
-        qs = instance._meta.translations_model.objects.filter(master=instance)
+
+        qs = instance._meta.translations_model._base_manager.using(instance._state.db)
+        qs = qs.filter(master=instance)
         if getattr(self, "partial", False):
-            qs = qs.filter(language_code__in=to_delete).delete()
-        elif translations_data:
-            qs.exclude(language_code__in=tuple(translations_data.keys())).delete()
+            deleted = qs.filter(language_code__in=to_delete).delete()[0] if to_delete else 0
+        else:
+            deleted = qs.exclude(language_code__in=tuple(translations_data.keys())).delete()[0]
+        bitmap_field = get_language_bitmap_field(instance.__class__)
+        if deleted and bitmap_field is not None:
+            bitmap_field.rebuild(instance.__class__._base_manager.using(instance._state.db)
+                                                            .filter(pk=instance.pk))
+            instance.__dict__.pop(bitmap_field.attname, None)   # reload on access
         return instance
 
+    def get_existing_translations(self, instance):
+        ''' Return existing translations of instance, as a language => translation
+            dict. Reuses translations loaded while validating nested translations
+            or prefetched, only querying the database if neither is available.
+        '''
+        field = self.fields.get(instance._meta.translations_accessor)
+        loaded = getattr(field, 'existing_translations', None)
+        if loaded is not None and loaded[0] is instance:
+            return loaded[1]
+        return {obj.language_code: obj
+                for obj in getattr(instance, instance._meta.translations_accessor).all()}
+
+    def save_translations(self, instance, translations_data, existing):
+        ''' Save translations other than the one saved with instance, given as a
+            language => validated data dict. Existing translations are updated in
+            a single query, and new ones inserted in another, unless saving them
+            runs user code.
+        '''
+        if (type(self).update_translation is not TranslationsMixin.update_translation or
+                has_custom_save(instance.__class__)):
+            # Overridden update_translation or save(), or signal receivers:
+            # save translations one by one through the combined model
+            for language, translation_data in translations_data.items():
+                translation = existing.get(language)
+                if translation is None:
+                    instance.translate(language)
+                else:
+                    set_cached_translation(instance, translation)
+                self.update_translation(instance, translation_data)
+            return
+
+        trans_model = instance._meta.translations_model
+        fields = get_translation_fields(trans_model)
+        to_create, to_update, update_fields = [], [], set()
+        for language, translation_data in translations_data.items():
+            vetoed = set(translation_data).intersection(('id', 'master', 'master_id', 'language_code'))
+            if vetoed:
+                raise KeyError('These fields are not allowed in data: %s' % ', '.join(vetoed))
+            translation = existing.get(language)
+            if translation is None:
+                translation = trans_model(language_code=language, master=instance)
+                to_create.append(translation)
+            else:
+                to_update.append(translation)
+                update_fields.update(fields.intersection(translation_data))
+            for key, value in translation_data.items():
+                setattr(translation, key, value)
+
+        manager = trans_model._base_manager.db_manager(instance._state.db)
+        if to_update and update_fields:
+            manager.bulk_update(to_update, sorted(update_fields))
+        if to_create:
+            bulk_create_translations(instance, to_create)
+            bitmap_field = get_language_bitmap_field(instance.__class__)
+            if bitmap_field is not None:
+                languages = [translation.language_code for translation in to_create]
+                bitmap_field.add_languages(instance.__class__._base_manager.using(instance._state.db)
+                                                                       .filter(pk=instance.pk),
+                                           languages)
+                if bitmap_field.attname in instance.__dict__:
+                    setattr(instance, bitmap_field.attname,
+                            getattr(instance, bitmap_field.attname) | bitmap_field.get_bits(languages))
+
     def update_translation(self, instance, data):
+        ''' Update the translation loaded on instance with data and save it.
+            Overriding it disables batched writes of nested translations.
+        '''
         fields = {field.name
                      for field in self.Meta.model._meta.translations_model._meta.get_fields()
                      if not field.is_relation or                    # regular fields are ok
                         field.one_to_one or                         # one to one is ok
                         field.many_to_one and field.related_model}  # many_to_one only if not generic
         fields.intersection_update(data)
-        vetoed = fields.intersection('id', 'master', 'master_id', 'language_code')
+        vetoed = fields.intersection(('id', 'master', 'master_id', 'language_code'))
         if vetoed:
-            raise KeyError('These fields are not allowed in data: ' % ', '.join(vetoed))
+            raise KeyError('These fields are not allowed in data: %s' % ', '.join(vetoed))
 
         for key, value in data.items():
             setattr(instance, key, value)
@@ -181,6 +316,10 @@ class TranslatableModelMixin:
                                'that enforce a language'),
     }
 
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        return use_translatable_list(super().many_init(*args, **kwargs))
+
     def __init__(self, *args, **kwargs):
         # We use an exception because None is a valid value for language
         try:
@@ -235,7 +374,7 @@ class TranslatableModelMixin:
                 pass
         # If field is found in translation_model rebuild field with correct model and info.
         if field is not None:
-            trans_info = model_meta.get_field_info(trans_model)
+            trans_info = get_translations_field_info(trans_model)
             return super().build_field(
                 field_name, trans_info, trans_model, nested_depth
             )
@@ -279,6 +418,14 @@ class TranslatableModelMixin:
 
         return super().update(instance, data)
 
+def use_translatable_list(list_serializer):
+    ''' Turn a default list serializer into a TranslatableListSerializer.
+        Serializers setting Meta.list_serializer_class are left alone.
+    '''
+    if type(list_serializer) is serializers.ListSerializer:
+        list_serializer.__class__ = TranslatableListSerializer
+    return list_serializer
+
 #=============================================================================
 
 class TranslatableModelSerializer(TranslatableModelMixin, serializers.ModelSerializer):
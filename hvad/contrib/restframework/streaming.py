@@ -0,0 +1,59 @@
+""" Streaming list responses for use with django-rest-framework
+    Extension to hvad public API.
+
+    StreamingJSONRenderer       - JSON renderer writing a list one item at a time
+    StreamingListModelMixin     - List view mixin streaming the whole queryset
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from itertools import islice
+
+__all__ = (
+    'StreamingJSONRenderer',
+    'StreamingListModelMixin',
+)
+
+#=============================================================================
+
+class StreamingJSONRenderer(JSONRenderer):
+    """ JSON renderer that can render an iterable as a JSON array, item by item,
+        so the whole list never has to be held in memory.
+    """
+    def render_stream(self, items, accepted_media_type=None, renderer_context=None):
+        """ Generate the JSON array of items, as bytes """
+        yield b'['
+        for index, item in enumerate(items):
+            if index:
+                yield b','
+            yield self.render(item, accepted_media_type, renderer_context)
+        yield b']'
+
+
+class StreamingListModelMixin:
+    """ Replacement for ListModelMixin that streams the response. The queryset
+        is iterated in chunks of stream_chunk_size objects, using a server-side
+        cursor where the database supports it. Each chunk is serialized on its
+        own, so hvad serializers load translations once per chunk, and written
+        out before the next one is fetched. The response is not paginated.
+    """
+    stream_chunk_size = 500
+    stream_renderer_class = StreamingJSONRenderer
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = self.stream_renderer_class()
+        renderer_context = self.get_renderer_context()
+        return StreamingHttpResponse(
+            renderer.render_stream(self.stream_data(queryset), renderer.media_type,
+                                   renderer_context),
+            content_type=renderer.media_type,
+        )
+
+    def stream_data(self, queryset):
+        """ Generate serialized representations of all objects in queryset """
+        iterator = queryset.iterator(chunk_size=self.stream_chunk_size)
+        while True:
+            chunk = list(islice(iterator, self.stream_chunk_size))
+            if not chunk:
+                break
+            yield from self.get_serializer(chunk, many=True).data
@@ -5,7 +5,9 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.settings import api_settings
 from hvad.utils import get_cached_translation, set_cached_translation
-from django.utils.translation import gettext_lazy as _, get_language, activate
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _, override
+from contextlib import nullcontext
 
 __all__ = ('TranslationListSerializer', )
 
@@ -19,6 +21,16 @@ class TranslationListSerializer(serializers.ListSerializer):
         'no_translation': _('At least one translation must be provided.'),
     }
 
+    @cached_property
+    def localized(self):
+        ''' Whether child fields render values in the active language, in which
+            case each translation is (de)serialized with its language activated.
+        '''
+        return any(getattr(field, 'localize', False) for field in self.child.fields.values())
+
+    def language_scope(self, language):
+        return override(language) if self.localized else nullcontext()
+
     def to_internal_value(self, data):
         if not isinstance(data, dict):
             message = self.error_messages['not_a_dict'].format(
@@ -45,18 +57,18 @@ class TranslationListSerializer(serializers.ListSerializer):
             if instance
             else {}
         )
-        old_language = get_language()
+        # Keep them around so the parent serializer can reuse them when saving
+        self.existing_translations = (instance, existing_objects)
         for language, translation in data.items():
-            activate(language)
             try:
                 self.child.instance = existing_objects.get(language)
-                validated = self.child.run_validation(translation)
+                with self.language_scope(language):
+                    validated = self.child.run_validation(translation)
             except ValidationError as exc:
                 errors[language] = exc.detail
             else:
                 ret[language] = validated
                 errors[language] = {}
-        activate(old_language)
         if any(errors.values()):
             raise ValidationError(errors)
         return ret
@@ -69,12 +81,10 @@ class TranslationListSerializer(serializers.ListSerializer):
         ''' Combine each translation in turn so the serializer has a full object '''
         result = {}
         stashed = get_cached_translation(instance)
-        old_language = get_language()
         for translation in getattr(instance, self.source).all():
-            activate(translation.language_code)
             set_cached_translation(instance, translation)
-            result[translation.language_code] = self.child.to_representation(instance)
-        activate(old_language)
+            with self.language_scope(translation.language_code):
+                result[translation.language_code] = self.child.to_representation(instance)
         set_cached_translation(instance, stashed)
         return result
 
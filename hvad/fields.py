@@ -4,11 +4,11 @@
 import django
 from django.apps import apps
 from django.db import models
-from django.db.models.expressions import Expression, Col, Value
+from django.db.models.expressions import Expression, Col
 from django.db.models.fields.related import ForeignObject, ReverseManyToOneDescriptor
 from django.utils import translation
 from django.utils.functional import cached_property
-from hvad.utils import set_cached_translation
+from hvad.utils import get_cached_languages, get_language_bitmap_field, set_cached_translation
 
 __all__ = ()
 
@@ -32,20 +32,21 @@ class FallbacksConstraint(Expression):
     def as_sql(self, compiler, connection):
         """ Build SQL for constraint """
         quote = compiler.quote_name_unless_alias
+        field = compiler.query.model._meta.get_field('language_code')
 
-        langcases = [
-            'WHEN \'%s\' THEN %d' % (lang, i)
-            for i, lang in enumerate(self.fallbacks)
-        ]
+        # Languages are passed as parameters, converted by the field so that
+        # non-string language storage works
+        langcases = ['WHEN %%s THEN %d' % i for i in range(len(self.fallbacks))]
         langcases.append('ELSE %d' % len(self.fallbacks))
         langcases = ' '.join(langcases)
+        params = [field.get_db_prep_value(lang, connection) for lang in self.fallbacks]
 
         return (' '.join((
             '(CASE {rha}.language_code', langcases, 'END)'
             ' < '
             '(CASE {lha}.language_code', langcases, 'END)',
             'OR ({rha}.language_code = {lha}.language_code AND {rha}.id < {lha}.id)',
-        )).format(lha=quote(self.lha), rha=quote(self.rha)), [])
+        )).format(lha=quote(self.lha), rha=quote(self.rha)), params * 2)
 
 
 class BetterTranslationsField:
@@ -93,15 +94,15 @@ class LanguageConstraint(Expression):
             Replace None with current language, providing lazy evaluation of language(None)
         """
         language = compiler.query.language_code or translation.get_language()
+        col_sql, col_params = self.col.as_sql(compiler, connection)
         if language == 'all':
             assert hasattr(compiler.query.model._meta, 'shared_model')
             value = Col(compiler.query.get_initial_alias(),
                         compiler.query.model._meta.get_field('language_code'), models.CharField())
+            val_sql, val_params = value.as_sql(compiler, connection)
         else:
-            value = Value(language)
-
-        col_sql, col_params = self.col.as_sql(compiler, connection)
-        val_sql, val_params = value.as_sql(compiler, connection)
+            # Converted by the field, so that non-string language storage works
+            val_sql, val_params = '%s', [self.col.target.get_db_prep_value(language, connection)]
         return (
             '{} = {}'.format(col_sql, val_sql),
             col_params + val_params
@@ -257,11 +258,19 @@ class TranslationsAccessor(ReverseManyToOneDescriptor):
 
             def all_languages(self):
                 """ Return a list of all available languages in db.
-                    Use the prefetch cache if available, otherwise hit the database.
+                    Use the prefetch cache or the languages cached by
+                    available_languages() if available, otherwise hit the database.
                 """
                 qs = self.all()
                 if qs._result_cache is not None:
                     return {obj.language_code for obj in qs}
+                languages = get_cached_languages(self.instance)
+                if languages is not None:
+                    return set(languages)
+                bitmap_field = get_language_bitmap_field(self.instance.__class__)
+                if bitmap_field is not None and bitmap_field.attname in self.instance.__dict__:
+                    return set(bitmap_field.get_languages(getattr(self.instance,
+                                                                  bitmap_field.attname)))
                 return set(qs.values_list('language_code', flat=True))
 
         return RelatedManager
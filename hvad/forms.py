@@ -1,22 +1,33 @@
 """ Translatable-model-aware forms for use as a replacement to django.forms
     Part of hvad public API.
 """
-from django.core.exceptions import FieldError, ValidationError
+import django
+from django.core.exceptions import FieldError, ValidationError, NON_FIELD_ERRORS
+from django.db import connections, router, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
 from django.forms.fields import CharField
 from django.forms.formsets import formset_factory
 from django.forms.models import (BaseModelForm, ModelFormMetaclass,
     fields_for_model, model_to_dict, construct_instance, BaseInlineFormSet, BaseModelFormSet,
-    modelform_factory, inlineformset_factory, ALL_FIELDS)
+    ModelForm, modelform_factory, inlineformset_factory, ALL_FIELDS)
 from django.forms.utils import ErrorList
 from django.forms.widgets import Select
 from django.utils.translation import gettext as _, get_language
 from hvad.models import TranslatableModel, BaseTranslationModel
 from hvad.settings import hvad_settings
-from hvad.utils import (set_cached_translation, get_cached_translation, load_translation)
+from hvad.utils import (set_cached_translation, get_cached_translation, load_translation,
+                        load_translations, get_cached_languages, set_cached_languages,
+                        get_language_bitmap_field, has_custom_save,
+                        bulk_create_translations)
 from collections import OrderedDict
+from functools import reduce
+from operator import or_
+from threading import Lock
 
 __all__ = (
     'TranslatableModelForm',
+    'TranslatableModelFormSetMixin',
+    'TranslationFormMixin',
     'BaseTranslationFormSet',
     'translatable_modelform_factory',
     'translatable_modelformset_factory',
@@ -218,6 +229,59 @@ class TranslatableModelForm(BaseTranslatableModelForm, metaclass=TranslatableMod
 
 #=============================================================================
 
+class FormClassCache:
+    """ Bounded cache of form and formset classes built by factories, for
+        callers that would otherwise build identical classes over and over,
+        such as admin and views. Least recently used classes are evicted first.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._classes = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def make_key(cls, *parts):
+        """ Build a hashable key from parts, turning lists, tuples and dicts
+            into tuples. Returns None if some part cannot be hashed.
+        """
+        def freeze(value):
+            if isinstance(value, dict):
+                return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+            if isinstance(value, (list, tuple)):
+                return tuple(freeze(item) for item in value)
+            return value
+        key = freeze(parts)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key, build):
+        """ Return the class cached for key, calling build() to create it if
+            needed. A key of None bypasses the cache.
+        """
+        if key is None:
+            return build()
+        with self._lock:
+            klass = self._classes.get(key)
+            if klass is not None:
+                self._classes.move_to_end(key)
+                return klass
+        klass = build()
+        with self._lock:
+            self._classes[key] = klass
+            while len(self._classes) > self.maxsize:
+                self._classes.popitem(last=False)
+        return klass
+
+    def clear(self):
+        with self._lock:
+            self._classes.clear()
+
+form_class_cache = FormClassCache(256)
+
+
 def translatable_modelform_factory(language, model, form=TranslatableModelForm, *args, **kwargs):
     """ Build a TranslatableModelForm for given model.
         Returned form class will enforce given language.
@@ -235,12 +299,29 @@ def translatable_modelform_factory(language, model, form=TranslatableModelForm,
     return klass
 
 
+class TranslatableModelFormSetMixin:
+    ''' Mixin for model formsets of translatable models. When the formset
+        queryset is first evaluated, translations of all its instances in the
+        language of the form are loaded with a single query, so forms find
+        them cached instead of loading them one by one.
+    '''
+    def get_queryset(self):
+        evaluated = hasattr(self, '_queryset')
+        queryset = super().get_queryset()
+        if not evaluated:
+            enforce = hasattr(self.form, 'language')
+            language = getattr(self.form, 'language', None) or get_language()
+            load_translations(queryset, language, enforce)
+        return queryset
+
+
 def translatable_modelformset_factory(language, model, form=TranslatableModelForm,
                                       formfield_callback=None, formset=BaseModelFormSet,
                                       extra=1, can_delete=False, can_order=False,
                                       max_num=None, fields=None, exclude=None, **kwargs):
     """ Build a TranslatableModelFormSet for given model.
         Returned formset class will enforce given language.
+        TranslatableModelFormSetMixin is added to formset unless it already has it.
     """
 
     # This Django API changes often, handle args we know and raise for others
@@ -260,6 +341,8 @@ def translatable_modelformset_factory(language, model, form=TranslatableModelFor
         language, model, form=form, fields=fields, exclude=exclude,
         formfield_callback=formfield_callback, **form_kwargs
     )
+    if not issubclass(formset, TranslatableModelFormSetMixin):
+        formset = type(formset.__name__, (TranslatableModelFormSetMixin, formset), {})
     FormSet = formset_factory(form, formset, extra=extra, max_num=max_num,
                               can_order=can_order, can_delete=can_delete, **formset_kwargs)
     FormSet.model = model
@@ -288,6 +371,14 @@ def translatable_inlineformset_factory(language, parent_model, model, form=Trans
 
 #=============================================================================
 
+class TranslationFormMixin:
+    """ Mixin for forms of a BaseTranslationFormSet. It leaves unique checks
+        to the formset, which runs them for all forms at once.
+    """
+    def validate_unique(self):
+        pass
+
+
 class BaseTranslationFormSet(BaseInlineFormSet):
     """A kind of inline formset for working with an instance's translations.
     It keeps track of the real object and combine()s it to the translations
@@ -317,12 +408,6 @@ class BaseTranslationFormSet(BaseInlineFormSet):
 
         for form in self.forms:
             set_cached_translation(master, form.instance)
-            exclusions = form._get_validation_exclusions()
-            # fields from the shared model should not be validated
-            if type(exclusions) == set:
-                exclusions.union(f.name for f in master._meta.fields)
-            else:
-                exclusions.extend(f.name for f in master._meta.fields)
             try:
                 master.clean()
             except ValidationError as e:
@@ -340,22 +425,184 @@ class BaseTranslationFormSet(BaseInlineFormSet):
             raise ValidationError(_('At least one translation must be provided'),
                                   code='notranslation')
 
+    def validate_unique(self):
+        """ Check unique constraints of translations. Submitted translations are
+            checked against each other in memory, including their languages,
+            then against the database with one query per unique check.
+        """
+        errors = []
+        try:
+            super().validate_unique()
+        except ValidationError as e:
+            errors.extend(e.error_list)
+
+        forms_to_delete = self.deleted_forms
+        valid_forms = [form for form in self.forms
+                       if form.is_valid() and form not in forms_to_delete]
+
+        # Languages are not covered by Django, as translations' unique checks
+        # on (language_code, master) are filtered out
+        languages = set()
+        for form in valid_forms:
+            language = form.cleaned_data.get('language_code')
+            if not language:
+                continue
+            if language in languages:
+                errors.append(self.get_unique_error_message(['language_code']))
+                if django.VERSION >= (4, 0):
+                    form._errors[NON_FIELD_ERRORS] = self.error_class([self.get_form_error()],
+                                                                      renderer=self.renderer)
+                else: # pragma: no cover
+                    form._errors[NON_FIELD_ERRORS] = self.error_class([self.get_form_error()])
+                del form.cleaned_data['language_code']
+            languages.add(language)
+        # Like forms do, skip empty extra forms
+        valid_forms = [form for form in valid_forms
+                       if form.is_valid() and (form.has_changed() or not form.empty_permitted)]
+
+        # Check against the database, batching forms by unique check
+        all_unique_checks = {}
+        for form in valid_forms:
+            unique_checks, date_checks = form.instance._get_unique_checks(
+                exclude=form._get_validation_exclusions())
+            for check in unique_checks:
+                all_unique_checks.setdefault(check, []).append(form)
+            try:
+                date_errors = form.instance._perform_date_checks(date_checks)
+                if date_errors:
+                    raise ValidationError(date_errors)
+            except ValidationError as e:
+                form._update_errors(e)
+
+        for (model_class, unique_check), forms in all_unique_checks.items():
+            for form in self.find_unique_conflicts(model_class, unique_check, forms):
+                key = unique_check[0] if len(unique_check) == 1 else NON_FIELD_ERRORS
+                form._update_errors(ValidationError({key: [
+                    form.instance.unique_error_message(model_class, unique_check)
+                ]}))
+
+        if errors:
+            raise ValidationError(errors)
+
+    def find_unique_conflicts(self, model_class, unique_check, forms):
+        """ Return forms whose instance conflicts with a database row on
+            given unique check, using a single query.
+        """
+        features = connections[router.db_for_write(model_class)].features
+        branches = []
+        for index, form in enumerate(forms):
+            instance = form.instance
+            lookup = {}
+            for name in unique_check:
+                field = instance._meta.get_field(name)
+                value = getattr(instance, field.attname)
+                if value is None or (value == '' and
+                                     features.interprets_empty_strings_as_nulls):
+                    break
+                if field.primary_key and not instance._state.adding:
+                    break
+                lookup[name] = value
+            else:
+                condition = Q(**lookup)
+                pk = instance._get_pk_val(model_class._meta)
+                if not instance._state.adding and pk is not None:
+                    condition &= ~Q(pk=pk)
+                branches.append((index, condition))
+        if not branches:
+            return []
+
+        # Tag each matching row with the first form it conflicts with
+        matches = (model_class._default_manager
+                   .filter(reduce(or_, (condition for index, condition in branches)))
+                   .annotate(hvad_form=Case(*(When(condition, then=Value(index))
+                                              for index, condition in branches),
+                                            output_field=IntegerField()))
+                   .order_by().values_list('hvad_form', flat=True).distinct())
+        return [forms[index] for index in sorted(matches)]
+
+    def save(self, commit=True):
+        """ Save the formset. With commit, translations of changed forms are
+            collected and passed to save_translations() once deletions are done,
+            all in a single transaction.
+        """
+        if not commit:
+            return super().save(commit=False)
+
+        db = router.db_for_write(self.instance.__class__, instance=self.instance)
+        with transaction.atomic(using=db, savepoint=False):
+            self._pending_translations = []
+            try:
+                result = super().save(commit=True)
+                if self._pending_translations:
+                    self.save_translations(self._pending_translations)
+            finally:
+                del self._pending_translations
+        return result
+    save.alters_data = True
+
+    def save_translations(self, translations):
+        """ Save the master object and given translations of it.
+            If saving the model runs user code, either a custom save() or
+            signal receivers, each translation is loaded onto the master object,
+            which is then saved, so that code sees the combined model.
+            Otherwise, master object is saved once, with no translation loaded,
+            and translations are written in batch: one query for updated ones,
+            one for new ones.
+            Intended for overriding in user forms, to customize saving of
+            the combined model.
+        """
+        master = self.instance
+        if has_custom_save(master.__class__):
+            for translation in translations:
+                stashed = set_cached_translation(master, translation)
+                try:
+                    master.save()
+                finally:
+                    set_cached_translation(master, stashed)
+            return
+
+        stashed = set_cached_translation(master, None)
+        try:
+            master.save()
+        finally:
+            set_cached_translation(master, stashed)
+
+        db = master._state.db
+        manager = master._meta.translations_model._base_manager.db_manager(db)
+        existing, new = [], []
+        for translation in translations:
+            translation.master = master
+            (new if translation.pk is None else existing).append(translation)
+        if existing:
+            fields = [field.name for field in translations[0]._meta.concrete_fields
+                      if not field.primary_key and field.name != 'master']
+            manager.bulk_update(existing, fields)
+        if new:
+            bulk_create_translations(master, new)
+
+        languages = {translation.language_code for translation in translations}
+        bitmap_field = get_language_bitmap_field(master.__class__)
+        if bitmap_field is not None:
+            bitmap_field.add_languages(master.__class__._base_manager.using(db)
+                                                                 .filter(pk=master.pk),
+                                       languages)
+        cached_languages = get_cached_languages(master)
+        if cached_languages is not None:
+            set_cached_languages(master, cached_languages | languages)
+    save_translations.alters_data = True
+
     def _save_translation(self, form, commit=True):
-        """ Save translation for given translation form.
-            Do it by loading it onto the master object and saving the master object
-            so custom save() behavior is properly triggered.
+        """ Prepare translation for given translation form. On commit, it is
+            queued for save_translations(), called once all forms are processed.
         """
         obj = form.save(commit=False)
         assert isinstance(obj, BaseTranslationModel)
-
         if commit:
-            # We need to trigger custom save actions on the combined model
-            stashed = set_cached_translation(self.instance, obj)
-            self.instance.save()
-            if hasattr(obj, 'save_m2m'): # pragma: no cover
-                # cannot happen, but feature could be added, be ready
-                obj.save_m2m()
-            set_cached_translation(self.instance, stashed)
+            pending = getattr(self, '_pending_translations', None)
+            if pending is None:
+                self.save_translations([obj])
+            else:
+                pending.append(obj)
         return obj
 
     def save_new(self, form, commit=True):
@@ -387,13 +634,18 @@ def translationformset_factory(model, **kwargs):
     """ Works as a regular inlineformset_factory except for:
     - it is set up to work on the given model's translations table
     - it uses a BaseTranslationFormSet to handle combine() and language_code
+    - its form gets TranslationFormMixin, leaving unique checks to the formset
 
     Basic use: MyModelTranslationsFormSet = translationformset_factory(MyModel)
     """
     defaults = {
+        'form': ModelForm,
         'formset': BaseTranslationFormSet,
         'fk_name': 'master',
     }
     defaults.update(kwargs)
+    if not issubclass(defaults['form'], TranslationFormMixin):
+        defaults['form'] = type(defaults['form'].__name__,
+                                (TranslationFormMixin, defaults['form']), {})
     return inlineformset_factory(model, model._meta.translations_model, **defaults)
 
@@ -0,0 +1,23 @@
+""" Helpers shared by hvad management commands """
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.db import router
+
+def get_translatable_models(app_labels, using):
+    """ List concrete translatable models of given applications, or of all
+        applications if app_labels is empty, whose translations model is
+        migrated on database using.
+        Raises CommandError if an application does not exist.
+    """
+    try:
+        app_configs = [apps.get_app_config(label) for label in app_labels]
+    except LookupError as exc:
+        raise CommandError(str(exc))
+    return [
+        model
+        for app_config in (app_configs or apps.get_app_configs())
+        for model in app_config.get_models()
+        if hasattr(model._meta, 'translations_model')
+        and not model._meta.proxy
+        and router.allow_migrate_model(using, model._meta.translations_model)
+    ]
@@ -0,0 +1,49 @@
+""" Translation coverage report
+    Part of hvad public API.
+
+    Prints, for each translatable model, how many objects are translated in each
+    language, and how many translations leave translated fields empty.
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from hvad.management.commands import get_translatable_models
+from hvad.settings import hvad_settings
+
+__all__ = ('Command',)
+
+#===============================================================================
+
+class Command(BaseCommand):
+    help = ('Report how many objects of translatable models are translated in each '
+            'language, using one aggregate query per model.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='*',
+                            help='Only report on models from those applications.')
+        parser.add_argument('--language', action='append', dest='languages',
+                            help='Language to report on. Can be repeated. Defaults '
+                                 'to all configured languages.')
+        parser.add_argument('--missing', action='store_true',
+                            help='List primary keys of objects missing a translation.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Nominates a database to report on. Defaults to the '
+                                 '"default" database.')
+
+    def handle(self, **options):
+        app_labels, using = options['app_label'], options['database']
+        languages = options['languages'] or [code for code, name in hvad_settings.LANGUAGES]
+        translatable = get_translatable_models(app_labels, using)
+
+        for model in translatable:
+            manager = model._default_manager.db_manager(using)
+            coverage = manager.translation_coverage(languages)
+            self.stdout.write('%s: %d objects' % (model._meta.label, coverage.total))
+            for code, stats in coverage.languages.items():
+                empty = ', '.join('%s=%d' % item for item in stats.empty.items() if item[1])
+                self.stdout.write('  %s: %d translated, %d missing%s' % (
+                    code, stats.translated, stats.missing,
+                    ', empty: %s' % empty if empty else ''))
+                if options['missing'] and stats.missing:
+                    missing = manager.missing_translations(code)
+                    for pk in missing.values_list('pk', flat=True).iterator():
+                        self.stdout.write('    - %s' % pk)
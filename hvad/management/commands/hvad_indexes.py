@@ -0,0 +1,121 @@
+""" Index advisor for translation tables
+    Part of hvad public API.
+
+    Inspects translatable models and the indexes present in the database, and
+    prints DDL for the indexes hvad queries would benefit from, most useful first.
+"""
+from collections import namedtuple
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from hvad.management.commands import get_translatable_models
+from hvad.manager import TranslationQueryset
+
+__all__ = ('Command',)
+
+#===============================================================================
+
+HIGH, MEDIUM = 1, 2
+PRIORITIES = {HIGH: 'high', MEDIUM: 'medium'}
+
+Candidate = namedtuple('Candidate', 'priority model fields reason')
+
+def get_candidates(model):
+    """ List indexes that hvad queries on given translatable model would use.
+        Returns Candidate tuples, in decreasing order of usefulness. Field names
+        refer to the translations model.
+    """
+    translations_model = model._meta.translations_model
+    master = translations_model._meta.get_field('master').name
+    pk = translations_model._meta.pk.name
+    candidates = []
+    if not has_unique(translations_model, (master, 'language_code')):
+        # Fallbacks self-join matches rows on master, then compares language
+        # and id. Loading translations through _hvad_query matches master and
+        # language, which the same index covers. A unique index on master and
+        # language, as natural_key creates, serves both and makes id moot.
+        candidates.append(Candidate(HIGH, translations_model, (master, 'language_code', pk),
+                                    'fallbacks self-join and translation loading'))
+
+    # Language filter followed by translated default ordering
+    ordering = TranslationQueryset(model)._translate_fieldnames(model._meta.ordering or ())
+    fields = []
+    for name in ordering:
+        if not isinstance(name, str):
+            break
+        name = name.lstrip('-')
+        if name.startswith('master__') or '__' in name or name == '?':
+            break
+        fields.append(translations_model._meta.get_field(name).name)
+    if fields:
+        candidates.append(Candidate(MEDIUM, translations_model, ('language_code',) + tuple(fields),
+                                    'language filter with Meta.ordering'))
+    return candidates
+
+
+def has_unique(model, fields):
+    """ Tell whether model declares a unique index on given fields, in that order """
+    opts = model._meta
+    declared = list(opts.unique_together)
+    declared.extend(constraint.fields for constraint in opts.constraints
+                    if isinstance(constraint, models.UniqueConstraint)
+                    and getattr(constraint, 'condition', None) is None)
+    return any(tuple(opts.get_field(name).name for name in names) == fields
+               for names in declared)
+
+
+def is_covered(columns, existing):
+    """ Tell whether an index on columns is a leftmost prefix of an existing one """
+    return any(tuple(index[:len(columns)]) == columns for index in existing)
+
+#===============================================================================
+
+class Command(BaseCommand):
+    help = ('Recommend indexes on translation tables, based on the queries hvad '
+            'issues and the indexes present in the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='*',
+                            help='Only inspect models from those applications.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Nominates a database to inspect. Defaults to the '
+                                 '"default" database.')
+
+    def handle(self, **options):
+        app_labels, using = options['app_label'], options['database']
+        connection = connections[using]
+        translatable = get_translatable_models(app_labels, using)
+
+        recommendations = []
+        with connection.cursor() as cursor:
+            tables = set(connection.introspection.table_names(cursor))
+            for model in translatable:
+                table = model._meta.translations_model._meta.db_table
+                if table not in tables:
+                    self.stderr.write('Skipping %s: table %s does not exist.' %
+                                      (model._meta.label, table))
+                    continue
+                existing = [
+                    tuple(info['columns'])
+                    for info in connection.introspection.get_constraints(cursor, table).values()
+                    if info['index'] or info['unique'] or info['primary_key']
+                ]
+                for candidate in get_candidates(model):
+                    opts = candidate.model._meta
+                    columns = tuple(opts.get_field(name).column for name in candidate.fields)
+                    if not is_covered(columns, existing):
+                        recommendations.append(candidate)
+                        existing.append(columns)
+
+        if not recommendations:
+            self.stdout.write('No missing index found.')
+            return
+
+        recommendations.sort(key=lambda candidate: candidate.priority)
+        schema_editor = connection.schema_editor(collect_sql=True)
+        for candidate in recommendations:
+            index = models.Index(fields=list(candidate.fields))
+            index.set_name_with_model(candidate.model)
+            self.stdout.write('-- [%s] %s: %s' % (PRIORITIES[candidate.priority],
+                                                  candidate.model._meta.label,
+                                                  candidate.reason))
+            self.stdout.write('%s;' % index.create_sql(candidate.model, schema_editor))
@@ -0,0 +1,39 @@
+""" Language bitmap repair
+    Part of hvad public API.
+
+    Recomputes LanguageBitmapField values from translations, for instance after
+    adding the field to a model, or after translations were changed with raw SQL
+    or bulk operations hvad does not track.
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, router
+from hvad.management.commands import get_translatable_models
+from hvad.utils import get_language_bitmap_field
+
+__all__ = ('Command',)
+
+#===============================================================================
+
+class Command(BaseCommand):
+    help = ('Rebuild language bitmaps of translatable models from their translations, '
+            'using one update query per model.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='*',
+                            help='Only rebuild bitmaps of models from those applications.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Nominates a database to rebuild bitmaps on. Defaults to '
+                                 'the "default" database.')
+
+    def handle(self, **options):
+        app_labels, using = options['app_label'], options['database']
+        models = [
+            model for model in get_translatable_models(app_labels, using)
+            if get_language_bitmap_field(model) is not None
+            and router.allow_migrate_model(using, model)
+        ]
+
+        for model in models:
+            field = get_language_bitmap_field(model)
+            count = field.rebuild(model._base_manager.using(using).all())
+            self.stdout.write('%s.%s: %d objects' % (model._meta.label, field.name, count))
@@ -2,24 +2,38 @@
     Part of hvad public API.
 """
 import django
-from django.core.exceptions import FieldError
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, FieldError
 from django.db import connections, models, transaction, IntegrityError
 from django.db.models.query import QuerySet
 from django.db.models.sql.datastructures import Join, LOUTER
-from django.db.models import F, Q
+from django.db.models import BooleanField, Case, Count, Exists, F, OuterRef, Q, Value, When
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import WhereNode
 from django.db.models.query import (FlatValuesListIterable, ModelIterable, ValuesIterable,
                                     ValuesListIterable)
 from django.utils.functional import cached_property
 from django.utils.translation import get_language
+from hvad.collation import collate_ordering, get_collation
 from hvad.fields import BetterTranslationsField
-from hvad.query import (query_terms, q_children, expression_nodes,
-                        add_alias_constraints)
+from hvad.query import (query_terms, q_children, expression_nodes, where_node_children,
+                        add_alias_constraints, group_values, joined_update, query_is_sliced)
+from hvad.search import search_filter
 from hvad.settings import hvad_settings
+from hvad.utils import (get_language_bitmap_field, set_cached_languages, set_cached_translation,
+                        translation_rater)
+from collections import namedtuple
 from copy import deepcopy
+import hashlib
 import sys
 
 __all__ = ('TranslationQueryset', 'TranslationManager')
 
+Resolution = namedtuple('Resolution', 'object language_code translation')
+Coverage = namedtuple('Coverage', 'total languages')
+LanguageCoverage = namedtuple('LanguageCoverage', 'translated missing empty')
+
 #===============================================================================
 
 class _FieldTranslator:
@@ -72,7 +86,9 @@ class TranslatableModelIterable(ModelIterable):
         qs = self.queryset._clone()._add_language_filter()
         qs._iterable_class = ModelIterable
         qs._known_related_objects = {}
-        for obj in qs.iterator():
+        # chunk_size is only set when iterating with iterator(chunk_size=...)
+        for obj in (qs.iterator(chunk_size=self.chunk_size) if self.chunked_fetch else
+                    qs.iterator()):
             for name in qs._hvad_switch_fields:
                 try:
                     setattr(obj.master, name, getattr(obj, name))
@@ -134,6 +150,8 @@ class TranslationQueryset(QuerySet):
     despite this being used as the queryset for the *shared* Model!
     """
     override_classes = {}
+    delete_chunk_size = 1000
+    resolve_cache_alias = 'default'
     _skip_master_select = False
 
     def __init__(self, *args, **kwargs):
@@ -349,8 +367,44 @@ class TranslationQueryset(QuerySet):
             ordering = self.shared_model._meta.ordering
             self.query.order_by = self._translate_fieldnames(ordering or [])
 
+        collation = get_collation(self)
+        if collation is not None:
+            self.query.order_by = tuple(collate_ordering(self.model, self.query.order_by,
+                                                         collation))
         return self
 
+    def _fallbacks_are_neutral(self):
+        """ Tell whether the queryset would match the same objects without fallbacks.
+            Fallbacks pick exactly one translation for every object that has some, so
+            this holds as long as filters only look at shared fields.
+        """
+        if not self._language_fallbacks or self._language_code == 'all':
+            return False
+        query = self.query
+        if (query_is_sliced(query) or query.distinct or query.combinator or
+            query.annotations or query.extra or query.extra_tables):
+            return False
+
+        # Find out aliases reached by following the master key
+        base = next(iter(query.alias_map), None)
+        master = self.model._meta.get_field('master')
+        shared_aliases = set()
+        for alias, join in query.alias_map.items():
+            parent = getattr(join, 'parent_alias', None)
+            if parent in shared_aliases or (parent == base and join.join_field is master):
+                shared_aliases.add(alias)
+
+        for node in where_node_children(query.where):
+            if isinstance(node, Col):
+                if node.alias not in shared_aliases and not (
+                        node.alias == base and node.target is master):
+                    return False
+            elif isinstance(node, (WhereNode, Lookup, Value)):
+                continue
+            elif hasattr(node, 'as_sql') or hasattr(node, 'resolve_expression'):
+                return False    # unknown expression, it may use translated data
+        return True
+
     #===========================================================================
     # Queryset/Manager API
     #===========================================================================
@@ -388,14 +442,23 @@ class TranslationQueryset(QuerySet):
 
     def count(self):
         if self._result_cache is None:
-            qs = self._clone()._add_language_filter()
+            if self._fallbacks_are_neutral():
+                # Count objects having any translation, skipping the fallbacks join
+                qs = self._clone().language('all').fallbacks(None)._add_language_filter()
+                masteratt = self.model._meta.get_field('master').attname
+                qs = super(TranslationQueryset, qs).values(masteratt).distinct()
+            else:
+                qs = self._clone()._add_language_filter()
             return super(TranslationQueryset, qs).count()
         else:
             return len(self._result_cache)
 
     def exists(self):
         if self._result_cache is None:
-            qs = self._clone()._add_language_filter()
+            if self._fallbacks_are_neutral():
+                qs = self._clone().language('all').fallbacks(None)._add_language_filter()
+            else:
+                qs = self._clone()._add_language_filter()
             return super(TranslationQueryset, qs).exists()
         else:
             return bool(self._result_cache)
@@ -443,6 +506,107 @@ class TranslationQueryset(QuerySet):
             except self.model.DoesNotExist:
                 raise exc_info[1]
 
+    def resolve(self, cache_timeout=None, **kwargs):
+        """ Find the object having a translation that matches kwargs, in any language.
+            Returns a Resolution tuple:
+                object          - the object, loaded in the preferred language if it
+                                  has a translation in it, in the matched one otherwise
+                language_code   - the language of the matching translation
+                translation     - the translation in the preferred language, or None
+            Preferred language is the queryset's language, then its fallbacks.
+            If several objects match, those matching in a preferred language win.
+            If cache_timeout is set, results are cached for that many seconds.
+        """
+        assert kwargs, 'resolve() must be passed at least one keyword argument'
+        if self._language_code == 'all':
+            raise ValueError('Cannot use resolve() along with language(\'all\').')
+        languages = tuple(get_language() if lang is None else lang
+                          for lang in (self._language_code,) + (self._language_fallbacks or ()))
+
+        if cache_timeout is not None:
+            try:
+                sql = self.query.sql_with_params()
+            except EmptyResultSet:
+                raise self.model.DoesNotExist('%s matching query does not exist.' %
+                                              self.shared_model._meta.object_name)
+            key = 'hvad.resolve.%s' % hashlib.md5(repr((
+                self.db, self.shared_model._meta.label, languages, sorted(kwargs.items()), sql,
+            )).encode('utf-8')).hexdigest()
+            cache = caches[self.resolve_cache_alias]
+            result = cache.get(key)
+            if result is None:
+                result = self.resolve(**kwargs)
+                cache.set(key, result, cache_timeout)
+            return result
+
+        # Select matching translations and the preferred translations of the same
+        # objects in a single query. Matching uses the queryset's own filters.
+        condition = Q(**self._translate_args_kwargs(**kwargs)[1])
+        masteratt = self.model._meta.get_field('master').attname
+        qs = self._clone().language('all').fallbacks(None)._add_language_filter()
+        matching = super(TranslationQueryset, qs).filter(condition)
+        matching_pks = QuerySet.values(matching, 'pk')
+        rows = list(QuerySet(self.model, using=self.db)
+                    .select_related('master')
+                    .filter(**{masteratt + '__in': QuerySet.values(matching, masteratt)})
+                    .filter(Q(language_code__in=languages) | Q(pk__in=matching_pks))
+                    .annotate(hvad_match=Case(When(pk__in=matching_pks, then=Value(True)),
+                                              default=Value(False),
+                                              output_field=BooleanField())))
+
+        rater = translation_rater(*languages)
+        matches = sorted((row for row in rows if row.__dict__.pop('hvad_match')),
+                         key=rater, reverse=True)
+        if not matches:
+            raise self.model.DoesNotExist('%s matching query does not exist.' %
+                                          self.shared_model._meta.object_name)
+        best = {getattr(row, masteratt) for row in matches if rater(row) == rater(matches[0])}
+        if len(best) > 1:
+            raise self.shared_model.MultipleObjectsReturned(
+                'resolve() returned more than one %s in the same language.' %
+                self.shared_model._meta.object_name)
+
+        match = matches[0]
+        preferred = sorted((row for row in rows
+                            if getattr(row, masteratt) == getattr(match, masteratt)
+                            and rater(row) >= 0), key=rater, reverse=True)
+        translation = preferred[0] if preferred else None
+
+        obj = match.master
+        if self.shared_model._meta.proxy:
+            obj.__class__ = self.shared_model
+        set_cached_translation(obj, translation or match)
+        return Resolution(obj, match.language_code, translation)
+
+    def available_languages(self):
+        """ Return a dict mapping the primary key of each object matched by the
+            queryset to the frozenset of languages it has translations in, using a
+            single query. If the queryset was already evaluated, languages are also
+            cached on its objects, so their all_languages() method needs no query.
+        """
+        masteratt = self.model._meta.get_field('master').attname
+        objects = None
+        if self._result_cache is not None and self._iterable_class is TranslatableModelIterable:
+            objects = self._result_cache
+            pks = list({obj.pk for obj in objects})
+        else:
+            qs = self._clone()
+            if not qs._language_filter_tag:
+                qs._add_language_filter()
+            if not query_is_sliced(qs.query):
+                qs = QuerySet.order_by(qs)
+            pks = QuerySet.values(qs, masteratt)
+            features = connections[self.db].features
+            if query_is_sliced(qs.query) and not features.allow_sliced_subqueries_with_in:
+                pks = list(pks)
+
+        translations = QuerySet(self.model, using=self.db).filter(**{masteratt + '__in': pks})
+        result = group_values(translations, masteratt, 'language_code')
+        if objects is not None:
+            for obj in objects:
+                set_cached_languages(obj, result.setdefault(obj.pk, frozenset()))
+        return result
+
     def update_or_create(self, defaults=None, **kwargs):
         raise NotImplementedError()
 
@@ -484,25 +648,103 @@ class TranslationQueryset(QuerySet):
     delete.alters_data = True
     delete.queryset_only = True
 
-    def delete_translations(self):
+    def delete_translations(self, chunk_size=None, progress=None):
+        """ Delete matched translations, leaving shared instances alone.
+            - chunk_size: delete in chunks of at most that many translations, each
+              in its own transaction. Defaults to a single statement on backends that
+              support it, and to delete_chunk_size on others.
+            - progress: optional callable, invoked after each chunk with the
+              running total of deleted translations.
+            Returns the number of deleted translations.
+        """
         qs = self._clone()._add_language_filter()
-        if connections[self._db].features.update_can_self_select:
-            super(TranslationQueryset, qs).delete()
-        else:
-            with transaction.atomic(using=self._db, savepoint=False):
-                pks = list(super(TranslationQueryset, qs).values_list('pk', flat=True))
-                self.model._base_manager.filter(pk__in=pks).delete()
+        masteratt = self.model._meta.get_field('master').attname
+        bitmap_field = get_language_bitmap_field(self.shared_model)
+        shared_manager = self.shared_model._base_manager.db_manager(self.db)
+        if chunk_size is None:
+            if connections[self.db].features.update_can_self_select:
+                with transaction.atomic(using=self.db, savepoint=False):
+                    if bitmap_field is not None:
+                        # Clear language bits while matched translations still exist
+                        matched = QuerySet.order_by(qs)
+                        languages = QuerySet.values_list(matched, 'language_code', flat=True)
+                        for language in set(languages):
+                            masters = QuerySet.values(
+                                QuerySet.filter(matched, language_code=language), masteratt)
+                            bitmap_field.remove_languages(shared_manager.filter(pk__in=masters),
+                                                          [language])
+                    deleted = super(TranslationQueryset, qs).delete()[1].get(self.model._meta.label, 0)
+                if progress is not None:
+                    progress(deleted)
+                return deleted
+            chunk_size = self.delete_chunk_size
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer.')
+
+        # Walk matched translations in (master_id, pk) order, using the last row
+        # of each chunk as a keyset bound for the next one. With fallbacks, deleting
+        # a translation promotes the next one, so the bound must skip whole objects.
+        rows = QuerySet.order_by(QuerySet.values_list(qs, masteratt, 'pk', 'language_code'),
+                                 masteratt, 'pk')
+        manager = self.model._base_manager.db_manager(self.db)
+        deleted, last = 0, None
+        while True:
+            with transaction.atomic(using=self.db, savepoint=False):
+                if last is None:
+                    chunk_qs = rows
+                elif self._language_fallbacks and self._language_code != 'all':
+                    chunk_qs = QuerySet.filter(rows, **{'%s__gt' % masteratt: last[0]})
+                else:
+                    chunk_qs = QuerySet.filter(rows, Q(**{'%s__gt' % masteratt: last[0]}) |
+                                                     Q(**{masteratt: last[0], 'pk__gt': last[1]}))
+                chunk = list(chunk_qs[:chunk_size])
+                if not chunk:
+                    break
+                count = manager.filter(pk__in=[pk for master_id, pk, language in chunk]).delete()
+                deleted += count[1].get(self.model._meta.label, 0)
+                if bitmap_field is not None:
+                    masters = {}
+                    for master_id, pk, language in chunk:
+                        masters.setdefault(language, []).append(master_id)
+                    for language, master_ids in masters.items():
+                        bitmap_field.remove_languages(shared_manager.filter(pk__in=master_ids),
+                                                      [language])
+            last = chunk[-1]
+            if progress is not None:
+                progress(deleted)
+            if len(chunk) < chunk_size:
+                break
+        return deleted
     delete_translations.alters_data = True
 
     def update(self, **kwargs):
         qs = self._clone()._add_language_filter()
+        qs._for_write = True
         shared, translated = qs._split_kwargs(**kwargs)
         count = 0
-        if translated:
-            count += super(TranslationQueryset, qs).update(**translated)
-        if shared:
-            shared_qs = qs._get_shared_queryset()
-            count += shared_qs.update(**shared)
+        # Both tables are updated with a joined UPDATE where the backend supports
+        # it, falling back to Django's subquery-based update otherwise.
+        with transaction.atomic(using=qs.db, savepoint=False):
+            bitmap_field = get_language_bitmap_field(self.shared_model)
+            if bitmap_field is not None and 'language_code' in translated:
+                # Changing languages, bitmasks of matched objects must be rebuilt
+                masteratt = self.model._meta.get_field('master').attname
+                masters = list(QuerySet.values_list(QuerySet.order_by(qs._clone()),
+                                                    masteratt, flat=True))
+            if translated:
+                updated = joined_update(qs, self.model, 'id', translated)
+                if updated is None:
+                    updated = super(TranslationQueryset, qs._clone()).update(**translated)
+                count += updated
+            if shared:
+                masteratt = self.model._meta.get_field('master').column
+                updated = joined_update(qs, self.shared_model, masteratt, shared)
+                if updated is None:
+                    updated = qs._get_shared_queryset().update(**shared)
+                count += updated
+            if bitmap_field is not None and 'language_code' in translated:
+                bitmap_field.rebuild(self.shared_model._base_manager.using(qs.db)
+                                                                   .filter(pk__in=masters))
         return count
     update.alters_data = True
 
@@ -522,6 +764,27 @@ class TranslationQueryset(QuerySet):
         newargs, newkwargs = self._translate_args_kwargs(*args, **kwargs)
         return super().exclude(*newargs, **newkwargs)
 
+    def search(self, query, fields=None, rank=None):
+        """ Filter objects whose translation matches a full-text search query.
+            Fields default to all translated text fields. Each translation is
+            parsed with the PostgreSQL text search configuration of its language.
+            Matches are ranked under the annotation named rank, if set. With
+            fallbacks, only the translation each object is loaded in is searched.
+            Other databases raise NotSupportedError.
+        """
+        if fields is None:
+            fields = [field.name for field in self.model._meta.concrete_fields
+                      if isinstance(field, (models.CharField, models.TextField))
+                      and field.name != 'language_code']
+        else:
+            fields = [self.field_translator(name) for name in fields]
+        if self._language_code == 'all':
+            languages = tuple(code for code, name in hvad_settings.LANGUAGES)
+        else:
+            languages = tuple(get_language() if lang is None else lang
+                              for lang in (self._language_code,) + (self._language_fallbacks or ()))
+        return search_filter(self, query, fields, languages, rank)
+
     def extra(self, select=None, where=None, params=None, tables=None,
               order_by=None, select_params=None):
         qs = super().extra(select, where, params, tables,
@@ -623,6 +886,7 @@ class TranslationManager(models.Manager):
 
     queryset_class = TranslationQueryset
     fallback_class = QuerySet
+    coverage_cache_alias = 'default'
     default_class = TranslationQueryset if hvad_settings.USE_DEFAULT_QUERYSET else QuerySet
 
     def __init__(self, *args, **kwargs):
@@ -651,6 +915,78 @@ class TranslationManager(models.Manager):
     def get_queryset(self):
         return self._make_queryset(self.default_class, False)
 
+    def translation_coverage(self, languages=None, cache_timeout=None):
+        """ Count translations of all objects of the model, per language.
+            Returns a Coverage tuple:
+                total       - the number of objects
+                languages   - a dict mapping each language to a LanguageCoverage
+                              tuple, with the number of translated objects, the
+                              number of missing translations, and a dict mapping
+                              translated field names to the number of translations
+                              leaving them empty.
+            Languages default to those in hvad_settings.LANGUAGES. Translations
+            are counted with a single aggregate query.
+            If cache_timeout is set, results are cached for that many seconds.
+        """
+        if languages is None:
+            languages = [code for code, name in hvad_settings.LANGUAGES]
+        languages = tuple(languages)
+
+        if cache_timeout is not None:
+            key = 'hvad.coverage.%s' % hashlib.md5(repr((
+                self.db, self.model._meta.label, languages,
+            )).encode('utf-8')).hexdigest()
+            cache = caches[self.coverage_cache_alias]
+            result = cache.get(key)
+            if result is None:
+                result = self.translation_coverage(languages)
+                cache.set(key, result, cache_timeout)
+            return result
+
+        # Empty means null, or blank for text fields
+        model = self.translations_model
+        empty = []
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.name in ('master', 'language_code'):
+                continue
+            condition = Q(**{'%s__isnull' % field.attname: True}) if field.null else None
+            if isinstance(field, (models.CharField, models.TextField)):
+                blank = Q(**{field.attname: ''})
+                condition = blank if condition is None else condition | blank
+            if condition is not None:
+                empty.append((field.name, Count('pk', filter=condition)))
+
+        rows = (model._base_manager.using(self.db)
+                     .filter(language_code__in=languages)
+                     .order_by().values('language_code')
+                     .annotate(hvad_translated=Count('pk'),
+                               **{'hvad_empty_%d' % index: aggregate
+                                  for index, (name, aggregate) in enumerate(empty)}))
+        rows = {row['language_code']: row for row in rows}
+        total = QuerySet(self.model, using=self.db).count()
+
+        result = {}
+        for code in languages:
+            row = rows.get(code, {})
+            translated = row.get('hvad_translated', 0)
+            result[code] = LanguageCoverage(translated, total - translated, {
+                name: row.get('hvad_empty_%d' % index, 0)
+                for index, (name, aggregate) in enumerate(empty)
+            })
+        return Coverage(total, result)
+
+    def missing_translations(self, language_code):
+        """ Return a queryset of objects that have no translation in given language.
+            It is a regular queryset, use iterator() to stream large results.
+        """
+        translations = (self.translations_model._base_manager.using(self.db)
+                                               .filter(master=OuterRef('pk'),
+                                                       language_code=language_code))
+        return (QuerySet(self.model, using=self.db)
+                .annotate(hvad_translated=Exists(translations))
+                .filter(hvad_translated=False)
+                .order_by('pk'))
+
     #===========================================================================
     # Internals
     #===========================================================================
@@ -6,19 +6,25 @@ from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
 from django.db import models, router, transaction
 from django.db.models.base import ModelBase
 from django.db.models.manager import Manager
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.constants import LOOKUP_SEP
 from django.db.models.signals import class_prepared
 from django.utils.translation import get_language
 from hvad.descriptors import LanguageCodeAttribute, TranslatedAttribute
 from hvad.exceptions import WrongManager
 from hvad.fields import SingleTranslationObject, MasterKey
 from hvad.manager import TranslationManager
+from hvad.query import q_children, expression_nodes
 from hvad.settings import hvad_settings
-from hvad.utils import get_cached_translation, set_cached_translation, SmartGetField
+from hvad.utils import (get_cached_languages, set_cached_languages, get_cached_translation,
+                        set_cached_translation, get_language_bitmap_field, SmartGetField)
 from types import MethodType
 from itertools import chain
 import sys
 
-__all__ = ('TranslatableModel', 'TranslatedFields', 'NoTranslation')
+__all__ = ('TranslatableModel', 'TranslatedFields', 'CompactLanguageCodeField',
+           'LanguageBitmapField', 'NoTranslation')
 
 forbidden_translated_fields = ('Meta', 'objects', 'master', 'master_id')
 
@@ -28,16 +34,187 @@ NoTranslation = object()
 
 #===============================================================================
 
+class CompactLanguageCodeField(models.Field):
+    """ Language code field storing languages as small integers.
+        Python values are language codes. They are mapped to their 1-based position
+        in the languages list, which defaults to codes in hvad_settings.LANGUAGES.
+        The list is frozen into migrations, languages may only be appended to it.
+    """
+    description = 'Language code stored as a small integer'
+
+    def __init__(self, *args, languages=None, **kwargs):
+        if languages is None:
+            languages = [code for code, name in hvad_settings.LANGUAGES]
+        self.languages = tuple(languages)
+        self._language_ids = {code: index for index, code in enumerate(self.languages, 1)}
+        names = dict(hvad_settings.LANGUAGES)
+        kwargs.setdefault('choices', [(code, names.get(code, code)) for code in self.languages])
+        super().__init__(*args, **kwargs)
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        missing = [code for code, name in hvad_settings.LANGUAGES
+                   if code not in self._language_ids]
+        if missing:
+            errors.append(checks.Error(
+                'Languages %s are not listed in field languages and cannot be stored.' %
+                ', '.join(missing),
+                hint='Append them to the languages argument of the field.',
+                obj=self, id='hvad.models.E03'))
+        return errors
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop('choices', None)
+        kwargs['languages'] = list(self.languages)
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'PositiveSmallIntegerField'
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return self.languages[value - 1] if 0 < value <= len(self.languages) else None
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def get_prep_value(self, value):
+        """ Map language code to its integer. Unknown languages map to 0, which is
+            never stored, so lookups on them match nothing.
+        """
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, int):
+            return value
+        return self._language_ids.get(value, 0)
+
+    def get_db_prep_save(self, value, connection):
+        if value is not None and not isinstance(value, int) and value not in self._language_ids:
+            raise ValueError('Language %r cannot be stored in field %s, it must be one '
+                             'of %s.' % (value, self, ', '.join(self.languages)))
+        return super().get_db_prep_save(value, connection)
+
+
+class LanguageBitmapField(models.BigIntegerField):
+    """ Bitmask of the languages an object has translations in, kept up to date
+        by hvad. Bit n is set for the n-th language of the languages list, which
+        defaults to codes in hvad_settings.LANGUAGES. The list is frozen into
+        migrations, languages may only be appended to it.
+    """
+    description = 'Languages an object is translated in, as a bitmask'
+
+    def __init__(self, *args, languages=None, **kwargs):
+        if languages is None:
+            languages = [code for code, name in hvad_settings.LANGUAGES]
+        if len(languages) > 63:
+            raise ValueError('LanguageBitmapField cannot hold more than 63 languages.')
+        self.languages = tuple(languages)
+        self._language_bits = {code: 1 << index for index, code in enumerate(self.languages)}
+        kwargs.setdefault('default', 0)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if not hasattr(self.model._meta, 'translations_model'):
+            errors.append(checks.Error(
+                'LanguageBitmapField can only be used on translatable models.',
+                obj=self, id='hvad.models.E05'))
+        missing = [code for code, name in hvad_settings.LANGUAGES
+                   if code not in self._language_bits]
+        if missing:
+            errors.append(checks.Error(
+                'Languages %s are not listed in field languages and will not be tracked.' %
+                ', '.join(missing),
+                hint='Append them to the languages argument of the field.',
+                obj=self, id='hvad.models.E04'))
+        return errors
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('default') == 0:
+            del kwargs['default']
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        kwargs['languages'] = list(self.languages)
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        cls._meta.language_bitmap_field = self
+
+    def pre_save(self, model_instance, add):
+        """ Leave the stored value alone on updates. Bits are only changed by
+            update queries, so saving a stale instance does not undo them.
+        """
+        value = super().pre_save(model_instance, add)
+        return value if add else F(self.attname)
+
+    def get_bits(self, languages):
+        """ Return the bitmask for given languages, ignoring unknown ones """
+        bits = 0
+        for code in languages:
+            bits |= self._language_bits.get(code, 0)
+        return bits
+
+    def get_languages(self, value):
+        """ Return the frozenset of languages set in bitmask value """
+        return frozenset(code for code, bit in self._language_bits.items() if value & bit)
+
+    def add_languages(self, queryset, languages):
+        """ Set bits of languages on all objects of queryset """
+        bits = self.get_bits(languages)
+        return queryset.update(**{self.attname: F(self.attname).bitor(bits)}) if bits else 0
+
+    def remove_languages(self, queryset, languages):
+        """ Clear bits of languages on all objects of queryset """
+        bits = self.get_bits(languages)
+        return queryset.update(**{self.attname: F(self.attname).bitand(~bits)}) if bits else 0
+
+    def rebuild(self, queryset):
+        """ Recompute bitmasks of all objects of queryset from their translations """
+        translations_model = self.model._meta.translations_model
+        bits = Case(*(When(language_code=code, then=Value(bit))
+                      for code, bit in self._language_bits.items()),
+                    default=Value(0), output_field=models.BigIntegerField())
+        # Languages are unique per object, summing their bits sets them all
+        subquery = (translations_model._base_manager.filter(master=OuterRef('pk'))
+                                                    .order_by().values('master')
+                                                    .annotate(hvad_bits=Sum(bits))
+                                                    .values('hvad_bits'))
+        return queryset.update(**{self.attname: Coalesce(
+            Subquery(subquery, output_field=models.BigIntegerField()), Value(0),
+        )})
+
+
+class HasLanguage(models.Lookup):
+    """ Lookup matching objects translated in a language, using their bitmask """
+    lookup_name = 'has_language'
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [self.lhs.output_field.get_bits([value])]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '(%s & %s) <> 0' % (lhs, rhs), list(lhs_params) + list(rhs_params)
+LanguageBitmapField.register_lookup(HasLanguage)
+
+#===============================================================================
+
 class TranslatedFields:
     """ Wrapper class to define translated fields on a model. """
 
-    def __init__(self, meta=None, base_class=None, **fields):
+    def __init__(self, meta=None, base_class=None, natural_key=False, **fields):
         forbidden = set(forbidden_translated_fields).intersection(fields)
         if forbidden:
             raise ImproperlyConfigured(
                 'Invalid translated field: %s' % ', '.join(sorted(forbidden)))
         self.meta = meta or {}
         self.base_class = base_class
+        self.natural_key = natural_key
         self.fields = fields
 
     @staticmethod
@@ -54,6 +231,42 @@ class TranslatedFields:
                     'untranslated fields, such as %r.' % (name, constraint))
         return sconst, tconst
 
+    @staticmethod
+    def _referenced_fields(obj):
+        """ Collect names of fields an index or constraint depends on """
+        names = set()
+        for attr in ('fields', 'include'):
+            names.update(name.lstrip('-') for name in getattr(obj, attr, None) or ())
+        expressions = list(getattr(obj, 'expressions', None) or ())
+        for attr in ('condition', 'check'):
+            condition = getattr(obj, attr, None)
+            if isinstance(condition, Q):
+                for child, children, index in q_children(condition):
+                    if isinstance(child, tuple):
+                        names.add(child[0])
+                        expressions.append(child[1])
+                    else:
+                        expressions.append(child)
+        for expression in expressions:
+            names.update(node.name for node in expression_nodes(expression)
+                         if isinstance(node, F))
+        return {name.split(LOOKUP_SEP)[0] for name in names}
+
+    @classmethod
+    def _split_objects(cls, objects, fields, name):
+        sobjs, tobjs = [], []
+        for obj in objects:
+            names = cls._referenced_fields(obj)
+            if names and names.issubset(fields):
+                tobjs.append(obj)
+            elif not names.intersection(fields):
+                sobjs.append(obj)
+            else:
+                raise ImproperlyConfigured(
+                    'Meta.%s cannot mix translated and untranslated fields, '
+                    'such as %r.' % (name, obj))
+        return sobjs, tobjs
+
     def contribute_to_class(self, model, name):
         if model._meta.order_with_respect_to in self.fields:
             raise ImproperlyConfigured(
@@ -89,8 +302,11 @@ class TranslatedFields:
 
         if not model._meta.abstract:
             # If this class is abstract, we must not contribute management fields
+            # With natural_key, the (master, language_code) unique index covers
+            # lookups by master, so the foreign key does not need its own
             attrs['master'] = MasterKey(model, related_name=related_name,
-                                        editable=False, on_delete=models.CASCADE)
+                                        editable=False, on_delete=models.CASCADE,
+                                        db_index=not self.natural_key)
             if 'language_code' not in attrs:    # allow overriding
                 attrs['language_code'] = models.CharField(max_length=15, db_index=True)
 
@@ -160,7 +376,8 @@ class TranslatedFields:
         model._meta.original_attrs['unique_together'] = tuple(sconst)
         meta['unique_together'] = tuple(tconst)
         if not abstract:
-            meta['unique_together'] += (('language_code', 'master'),)
+            meta['unique_together'] += ((('master', 'language_code') if self.natural_key else
+                                         ('language_code', 'master')),)
 
         # Split fields in Meta.index_together
         sconst, tconst = self._split_together(
@@ -170,6 +387,14 @@ class TranslatedFields:
         model._meta.original_attrs['index_together'] = tuple(sconst)
         meta['index_together'] = tuple(tconst)
 
+        # Split Meta.indexes and Meta.constraints, including partial and covering ones
+        for name in ('indexes', 'constraints'):
+            sobjs, tobjs = self._split_objects(getattr(model._meta, name), tfields, name)
+            setattr(model._meta, name, sobjs)
+            if name in model._meta.original_attrs:
+                model._meta.original_attrs[name] = sobjs
+            meta[name] = list(meta.get(name, ())) + tobjs
+
         return type('Meta', (object,), meta)
 
 #===============================================================================
@@ -177,13 +402,27 @@ class TranslatedFields:
 class BaseTranslationModel(models.Model):
     """ Base model for all translation models """
 
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(self.__class__, instance=self)
+        shared_model = self._meta.shared_model
+        bitmap_field = get_language_bitmap_field(shared_model)
+        with transaction.atomic(using=using, savepoint=False):
+            result = super().delete(using=using, keep_parents=keep_parents)
+            if bitmap_field is not None:
+                bitmap_field.remove_languages(shared_model._base_manager.using(using)
+                                                                    .filter(pk=self.master_id),
+                                              [self.language_code])
+        return result
+    delete.alters_data = True
+
     def _get_unique_checks(self, exclude=None, *args, **kwargs):
         # Due to the way translations are handled, checking for unicity of
         # the ('language_code', 'master') constraint is useless. We filter it out
         # here so as to avoid a useless query
         unique_checks, date_checks = super()._get_unique_checks(exclude=exclude,  *args, **kwargs)
         unique_checks = [check for check in unique_checks
-                         if check != (self.__class__, ('language_code', 'master'))]
+                         if check not in ((self.__class__, ('language_code', 'master')),
+                                          (self.__class__, ('master', 'language_code')))]
         return unique_checks, date_checks
 
     class Meta:
@@ -265,16 +504,38 @@ class TranslatableModel(models.Model):
                         tupdate.append(name)
             skwargs['update_fields'], tkwargs['update_fields'] = supdate, tupdate
 
+        save_shared = update_fields is None or bool(skwargs['update_fields'])
+        save_translation = translation is not None and (update_fields is None or
+                                                        bool(tkwargs['update_fields']))
+
+        # new translations set their language bit, stored along with the shared
+        # instance if it is being inserted, or with an update query otherwise
+        bitmap_field, new_bit = get_language_bitmap_field(self.__class__), 0
+        if save_translation and bitmap_field is not None and translation._state.adding:
+            new_bit = bitmap_field.get_bits([translation.language_code])
+            if bitmap_field.attname in self.__dict__:
+                setattr(self, bitmap_field.attname,
+                        (getattr(self, bitmap_field.attname) or 0) | new_bit)
+                if save_shared and self._state.adding:
+                    new_bit = 0
+
         # save share and translated model in a single transaction
         db = router.db_for_write(self.__class__, instance=self)
         with transaction.atomic(using=db, savepoint=False):
-            if update_fields is None or skwargs['update_fields']:
+            if save_shared:
                 super().save(*args, **skwargs)
-            if (update_fields is None or tkwargs['update_fields']) and translation is not None:
+            if save_translation:
                 if translation.pk is None and update_fields:
                     del tkwargs['update_fields'] # allow new translations
                 translation.master = self
                 translation.save(*args, **tkwargs)
+                languages = get_cached_languages(self)
+                if languages is not None:
+                    set_cached_languages(self, languages | {translation.language_code})
+            if new_bit:
+                bitmap_field.add_languages(self.__class__._base_manager.using(db)
+                                                                   .filter(pk=self.pk),
+                                           [translation.language_code])
     save.alters_data = True
 
     def translate(self, language_code):
@@ -0,0 +1,107 @@
+""" Migration operations for translation tables
+    Part of hvad public API.
+"""
+from django.db.migrations.operations import AlterField
+from django.db.migrations.operations.base import Operation
+from django.db.models import Case, CharField, Value, When
+from hvad.collation import DEFAULT_COLLATION, collation_name
+from hvad.models import CompactLanguageCodeField
+from hvad.settings import hvad_settings
+
+__all__ = ('CompactLanguageCode', 'CreateCollations')
+
+#===============================================================================
+
+class CompactLanguageCode(AlterField):
+    """ Convert a translation table's language_code column from strings to
+        integers, turning it into a CompactLanguageCodeField. Existing rows
+        are converted, unknown languages make the migration fail.
+        Reversible: reverting converts integers back to language codes.
+    """
+    def __init__(self, model_name, languages=None, name='language_code', **kwargs):
+        self.field_kwargs = kwargs
+        field = CompactLanguageCodeField(languages=languages, **kwargs)
+        super().__init__(model_name, name, field)
+
+    def deconstruct(self):
+        kwargs = dict(self.field_kwargs, model_name=self.model_name,
+                      languages=list(self.field.languages))
+        if self.name != 'language_code':
+            kwargs['name'] = self.name
+        return (self.__class__.__name__, [], kwargs)
+
+    def _convert(self, model, using, mapping):
+        """ Rewrite column values in place, using given {old: new} mapping """
+        manager = model._base_manager.db_manager(using)
+        unknown = manager.exclude(**{'%s__in' % self.name: list(mapping)})
+        unknown = sorted(set(unknown.values_list(self.name, flat=True)))
+        if unknown:
+            raise ValueError('Cannot convert %s.%s, languages %s are not in the language '
+                             'list.' % (model._meta.label, self.name,
+                                        ', '.join(map(str, unknown))))
+        manager.update(**{self.name: Case(
+            *(When(**{self.name: old, 'then': Value(new)}) for old, new in mapping.items()),
+            output_field=CharField()
+        )})
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            # Store integers as strings first, the column type change then casts them
+            self._convert(model, schema_editor.connection.alias, {
+                code: str(index) for index, code in enumerate(self.field.languages, 1)
+            })
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            self._convert(model, schema_editor.connection.alias, {
+                str(index): code for index, code in enumerate(self.field.languages, 1)
+            })
+
+    def describe(self):
+        return 'Compact language codes of %s' % self.model_name
+
+#===============================================================================
+
+class CreateCollations(Operation):
+    """ Create the collations used for locale-aware ordering of translated text.
+        They are ICU collations, created on PostgreSQL only. Other backends do
+        not need them, for them this operation does nothing. The default
+        collation, for other languages, is created as well.
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, languages=None):
+        if languages is None:
+            languages = [code for code, name in hvad_settings.LANGUAGES]
+        self.languages = list(languages)
+
+    def deconstruct(self):
+        return (self.__class__.__name__, [], {'languages': self.languages})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            collations = [(collation_name(code), code) for code in self.languages]
+            collations.append((DEFAULT_COLLATION, 'und'))
+            for name, locale in collations:
+                schema_editor.execute(
+                    'CREATE COLLATION IF NOT EXISTS %s (provider = icu, locale = %s)' % (
+                        schema_editor.quote_name(name), schema_editor.quote_value(locale),
+                    ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            # The default collation is shared by all operations and left in place
+            for code in self.languages:
+                schema_editor.execute('DROP COLLATION IF EXISTS %s' %
+                                      schema_editor.quote_name(collation_name(code)))
+
+    def describe(self):
+        return 'Create collations for languages %s' % ', '.join(self.languages)
@@ -0,0 +1,264 @@
+""" Keyset pagination for translatable querysets
+    Part of hvad public API.
+
+    Pages are located by the sort key of the last row of the previous page rather
+    than by an offset, so the cost of fetching a page does not depend on its depth.
+"""
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BooleanField, F, Value
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import Expression
+from hvad.collation import Collate, get_collation, is_collatable
+from hvad.exceptions import WrongManager
+from hvad.manager import TranslationQueryset
+from hvad.query import add_where_expression
+from collections.abc import Sequence
+import base64
+import binascii
+import json
+
+__all__ = ('KeysetPaginator', 'KeysetPage', 'InvalidCursor')
+
+# Backends that support row value comparisons, such as (a, b) > (1, 2)
+ROW_VALUE_VENDORS = ('postgresql', 'mysql', 'sqlite')
+
+#===============================================================================
+
+class InvalidCursor(InvalidPage):
+    """ Raised when a cursor cannot be decoded or does not match the ordering """
+    pass
+
+#===============================================================================
+
+class KeysetComparison(Expression):
+    """ Boolean expression matching rows that sort strictly after a position.
+        Compiles to a row value comparison when all columns sort in the same
+        direction, so databases can seek through a matching composite index.
+        Falls back to the equivalent OR-expansion otherwise.
+    """
+    def __init__(self, columns, descending, values):
+        """ Setup the comparison
+            columns     - expressions to compare, most significant first
+            descending  - for each column, whether it sorts in descending order
+            values      - for each column, the position value to compare with
+        """
+        super().__init__(output_field=BooleanField())
+        self.columns = list(columns)
+        self.descending = list(descending)
+        self.values = list(values)
+
+    def get_source_expressions(self):
+        return self.columns + self.values
+
+    def set_source_expressions(self, exprs):
+        self.columns, self.values = exprs[:len(self.columns)], exprs[len(self.columns):]
+
+    def as_sql(self, compiler, connection):
+        columns = [compiler.compile(col) for col in self.columns]
+        values = [compiler.compile(value) for value in self.values]
+
+        if len(set(self.descending)) == 1 and connection.vendor in ROW_VALUE_VENDORS:
+            params = []
+            for sql, col_params in columns + values:
+                params.extend(col_params)
+            return '({}) {} ({})'.format(
+                ', '.join(sql for sql, col_params in columns),
+                '<' if self.descending[0] else '>',
+                ', '.join(sql for sql, value_params in values),
+            ), params
+
+        # (a > 1 OR (a = 1 AND (b > 2 OR (b = 2 AND c > 3))))
+        sql, params = None, []
+        for (col_sql, col_params), (val_sql, val_params), desc in reversed(
+                list(zip(columns, values, self.descending))):
+            term = '{} {} {}'.format(col_sql, '<' if desc else '>', val_sql)
+            if sql is None:
+                sql, params = term, col_params + val_params
+            else:
+                sql = '{} OR ({} = {} AND {})'.format(term, col_sql, val_sql, sql)
+                params = (col_params + val_params) * 2 + params
+            sql = '(%s)' % sql
+        return sql, params
+
+#===============================================================================
+
+class KeysetPage(Sequence):
+    """ A page of results, along with cursors to reach adjacent pages """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<KeysetPage of %d items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """ Paginate a TranslationQueryset using keyset (seek) pagination.
+        Ordering fields must be non-nullable local fields of the shared or
+        translations model.
+        The primary key is appended to the ordering to make it total.
+    """
+    page_class = KeysetPage
+
+    def __init__(self, queryset, per_page, ordering=None):
+        """ Setup the paginator
+            queryset    - the TranslationQueryset to paginate
+            per_page    - the maximum number of items per page
+            ordering    - list of field names, optionally prefixed with '-'. If
+                          omitted, use the queryset's ordering, then the model's.
+        """
+        if not isinstance(queryset, TranslationQueryset):
+            raise TypeError('KeysetPaginator only works on TranslationQueryset, '
+                            'use language() to get one.')
+        if queryset._language_code == 'all':
+            raise ValueError('Cannot use keyset pagination along with language(\'all\').')
+        if int(per_page) < 1:
+            raise ValueError('per_page must be a positive integer.')
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = self._build_ordering(ordering)
+
+    def _build_ordering(self, ordering):
+        """ Resolve ordering into a list of (name, field, descending) tuples """
+        if ordering is None:
+            ordering = self.queryset.query.order_by
+            if not all(isinstance(name, str) for name in ordering):
+                raise ValueError('Keyset pagination does not support ordering '
+                                 'by expressions.')
+            ordering = tuple(dict.fromkeys(self._shared_name(name) for name in ordering))
+            ordering = ordering or self.queryset.shared_model._meta.ordering
+        elif isinstance(ordering, str):
+            ordering = (ordering,)
+
+        result, seen_pk = [], False
+        pk = self.queryset.shared_model._meta.pk
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = self._get_field(name)
+            seen_pk = seen_pk or field == pk
+            result.append((name, field, descending))
+        if not seen_pk:
+            result.append(('pk', pk, result[-1][2] if result else False))
+        return result
+
+    @staticmethod
+    def _shared_name(name):
+        """ Turn an ordering name of the translations model, such as
+            -master__shared_field, into its name on the shared model.
+        """
+        sign, name = ('-', name[1:]) if name.startswith('-') else ('', name)
+        parts = name.split(LOOKUP_SEP)
+        if len(parts) > 1 and parts[0] == 'master':
+            parts = parts[1:]
+        return sign + LOOKUP_SEP.join(parts)
+
+    def _get_field(self, name):
+        shared_model = self.queryset.shared_model
+        if name == 'pk':
+            return shared_model._meta.pk
+        if '__' in name or name == '?':
+            raise ValueError('Keyset pagination only supports ordering on local fields, '
+                             'not %r.' % name)
+        try:
+            field = shared_model._meta.get_field(name)
+        except (FieldDoesNotExist, WrongManager):
+            field = shared_model._meta.translations_model._meta.get_field(name)
+        if field.null:
+            # Comparisons with NULL are never true, rows would be skipped
+            raise ValueError('Keyset pagination does not support ordering on '
+                             'nullable field %r.' % name)
+        return field
+
+    #===========================================================================
+    # Cursors
+    #===========================================================================
+
+    def encode_cursor(self, instance, reverse=False):
+        """ Build the cursor pointing at given instance.
+            Reverse cursors select items before the instance, others after it.
+        """
+        keys = [getattr(instance, field.attname) for name, field, desc in self.ordering]
+        data = json.dumps({'k': keys, 'r': int(reverse)}, cls=DjangoJSONEncoder,
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        """ Decode a cursor, returning a (keys, reverse) tuple.
+            Raises InvalidCursor if the cursor is malformed.
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            keys, reverse = data['k'], bool(data['r'])
+            if len(keys) != len(self.ordering):
+                raise ValueError('Cursor does not match ordering')
+            keys = [field.to_python(key) for key, (name, field, desc) in zip(keys, self.ordering)]
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, ValidationError):
+            raise InvalidCursor('Invalid cursor')
+        return keys, reverse
+
+    #===========================================================================
+    # Pages
+    #===========================================================================
+
+    def get_queryset(self, keys=None, reverse=False):
+        """ Build the queryset for the page following (or preceding) given keys """
+        ordering = [('-' if desc != reverse else '') + name
+                    for name, field, desc in self.ordering]
+        qs = self.queryset.order_by(*ordering)
+        if keys is not None:
+            # Compare positions the way the database sorts them
+            collation = get_collation(qs)
+            columns = [qs._translate_expression(F(name)) for name, field, desc in self.ordering]
+            if collation is not None:
+                columns = [Collate(column, collation) if is_collatable(field) else column
+                           for column, (name, field, desc) in zip(columns, self.ordering)]
+            add_where_expression(qs, KeysetComparison(
+                columns=columns,
+                descending=[desc != reverse for name, field, desc in self.ordering],
+                values=[Value(key, output_field=field)
+                        for key, (name, field, desc) in zip(keys, self.ordering)],
+            ))
+        return qs
+
+    def page(self, cursor=None):
+        """ Return the page for given cursor, or the first page if cursor is None.
+            Raises InvalidCursor if the cursor is malformed.
+        """
+        keys, reverse = (None, False) if cursor is None else self.decode_cursor(cursor)
+        results = list(self.get_queryset(keys, reverse)[:self.per_page + 1])
+        has_more = len(results) > self.per_page
+        object_list = results[:self.per_page]
+        if reverse:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, keys is not None
+
+        return self.page_class(
+            object_list, self,
+            next_cursor=(self.encode_cursor(object_list[-1])
+                         if has_next and object_list else None),
+            previous_cursor=(self.encode_cursor(object_list[0], reverse=True)
+                             if has_previous and object_list else None),
+        )
@@ -6,11 +6,18 @@
     a new Django version comes out.
 """
 import django
-from django.db.models import Q
-from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Aggregate, CharField, Q
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
 from django.db.models.expressions import Expression, Col
 from django.db.models.sql.where import AND
 from collections import namedtuple
+import sqlite3
+
+try:
+    from django.core.exceptions import FullResultSet
+except ImportError: # pragma: no cover (Django < 4.2)
+    FullResultSet = ()
 
 __all__ = ()
 
@@ -117,6 +124,29 @@ def expression_nodes(expression):
         if isinstance(expression, Expression):
             todo.extend(expression.get_source_expressions())
 
+def where_node_children(node):
+    ''' Recursively visit a where node, yielding each node found in it, including
+        lookups and the expressions they compare.
+        - node: the where node to visit
+    '''
+    todo = [node]
+    while todo:
+        node = todo.pop()
+        yield node
+        if hasattr(node, 'children'):
+            todo.extend(node.children)
+        elif isinstance(node, Expression):
+            todo.extend(node.get_source_expressions())
+        else: # pragma: no cover (lookups are not expressions before Django 4.0)
+            todo.extend(getattr(node, attr) for attr in ('lhs', 'rhs') if hasattr(node, attr))
+
+#===============================================================================
+# Query inspection
+
+def query_is_sliced(query):
+    """ Whether query has a limit or offset. Query.is_sliced is Django 3.1+ """
+    return bool(query.low_mark) or query.high_mark is not None
+
 #===============================================================================
 # Query manipulations
 
@@ -140,3 +170,116 @@ def add_alias_constraints(queryset, alias, **kwargs):
             value
         ), AND)
     queryset.query.where.add(clause, AND)
+
+def add_where_expression(queryset, expression):
+    """ Add a boolean expression to queryset's WHERE clause, in place.
+        Bypass filter() so the expression is not compared to True on backends that
+        do not support conditional expressions in WHERE, which would defeat indexes.
+    """
+    queryset.query.where.add(expression.resolve_expression(queryset.query), AND)
+
+class GroupConcat(Aggregate):
+    """ Comma-separated concatenation of grouped values, on MySQL and SQLite """
+    function = 'GROUP_CONCAT'
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, output_field=CharField(), **extra)
+
+
+def group_values(queryset, key, field):
+    """ Map each value of key to the frozenset of values of field, in one query.
+        Values are aggregated by the database using ARRAY_AGG on PostgreSQL or
+        GROUP_CONCAT on MySQL and SQLite, provided field is stored as a string
+        that never contains commas. Otherwise, one row per value is fetched.
+    """
+    queryset = queryset.order_by()
+    vendor = connections[queryset.db].vendor
+    internal_type = queryset.model._meta.get_field(field).get_internal_type()
+    if internal_type == 'CharField' and vendor in ('postgresql', 'mysql', 'sqlite'):
+        if vendor == 'postgresql':
+            from django.contrib.postgres.aggregates import ArrayAgg
+            aggregate, split = ArrayAgg(field), lambda values: values
+        else:
+            aggregate, split = GroupConcat(field), lambda values: values.split(',')
+        rows = queryset.values(key).annotate(hvad_values=aggregate).values_list(key, 'hvad_values')
+        return {value: frozenset(split(values)) for value, values in rows}
+
+    result = {}
+    for value, item in queryset.values_list(key, field):
+        result.setdefault(value, set()).add(item)
+    return {value: frozenset(items) for value, items in result.items()}
+
+def joined_update(queryset, model, column, values):
+    """ Update rows of model joined to queryset's base table, in a single statement.
+        Uses UPDATE ... FROM on PostgreSQL and SQLite, and UPDATE ... JOIN on MySQL.
+        queryset    - queryset selecting the rows to join, language filter applied
+        model       - model to update, its primary key is matched against column
+        column      - column of queryset's base table referencing model rows
+        values      - dict of field name => value, as given to QuerySet.update
+        Returns the number of updated rows, or None if the backend or values are not
+        supported, in which case the caller must fall back to a regular update.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        if sqlite3.sqlite_version_info < (3, 33, 0): # pragma: no cover
+            return None
+    elif connection.vendor not in ('postgresql', 'mysql'): # pragma: no cover
+        return None
+
+    query = queryset.query.chain()
+    if query_is_sliced(query) or query.distinct or query.combinator:
+        return None
+    if (model._meta.db_table == query.base_table and
+        sum(1 for alias in query.alias_map if query.alias_refcount[alias]) <= 1):
+        return None     # nothing to join, a regular update is simpler
+
+    qn = connection.ops.quote_name
+    target = qn('hvad_target')
+    assignments, update_params = [], []
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        if (not field.concrete or field.many_to_many or field.primary_key or
+            hasattr(value, 'resolve_expression') or hasattr(field, 'get_placeholder')):
+            return None
+        if hasattr(value, 'prepare_database_save'):
+            if not field.remote_field:
+                return None
+            value = value.prepare_database_save(field)
+        assignments.append(qn(field.column))
+        update_params.append(field.get_db_prep_save(value, connection=connection))
+
+    if django.VERSION >= (4, 0):
+        query.clear_ordering(force=True)
+    else: # pragma: no cover
+        query.clear_ordering(True)
+    compiler = query.get_compiler(connection=connection)
+    try:
+        where, where_params = compiler.compile(query.where)
+    except EmptyResultSet:
+        return 0
+    except FullResultSet: # pragma: no cover (Django >= 4.2)
+        where, where_params = '', []
+    from_clause, from_params = compiler.get_from_clause()
+    condition = '{}.{} = {}.{}'.format(target, qn(model._meta.pk.column),
+                                       compiler.quote_name_unless_alias(query.base_table),
+                                       qn(column))
+    if where:
+        condition = '{} AND ({})'.format(condition, where)
+
+    if connection.vendor == 'mysql':
+        sql = 'UPDATE {} INNER JOIN {} {} ON ({}) SET {}'.format(
+            ' '.join(from_clause), qn(model._meta.db_table), target, condition,
+            ', '.join('{}.{} = %s'.format(target, col) for col in assignments),
+        )
+        params = list(from_params) + list(where_params) + update_params
+    else:
+        sql = 'UPDATE {} AS {} SET {} FROM {} WHERE {}'.format(
+            qn(model._meta.db_table), target,
+            ', '.join('{} = %s'.format(col) for col in assignments),
+            ' '.join(from_clause), condition,
+        )
+        params = update_params + list(from_params) + list(where_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
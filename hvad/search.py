@@ -0,0 +1,100 @@
+""" Full-text search over translated fields
+    Part of hvad public API.
+
+    On PostgreSQL, translations are matched with text search vectors built with
+    the text search configuration of their language, so stemming and stop words
+    follow the language of each translation. Other databases are not supported.
+"""
+import django
+from django.db import NotSupportedError, connections, models
+from django.db.models import Case, Q, Value, When
+from django.db.models.query import QuerySet
+
+__all__ = ('SEARCH_CONFIGS', 'search_config', 'search_index')
+
+#===============================================================================
+
+# PostgreSQL text search configurations, by language code
+SEARCH_CONFIGS = {
+    'ar': 'arabic',
+    'da': 'danish',
+    'de': 'german',
+    'el': 'greek',
+    'en': 'english',
+    'es': 'spanish',
+    'fi': 'finnish',
+    'fr': 'french',
+    'hu': 'hungarian',
+    'id': 'indonesian',
+    'it': 'italian',
+    'lt': 'lithuanian',
+    'nb': 'norwegian',
+    'nl': 'dutch',
+    'nn': 'norwegian',
+    'no': 'norwegian',
+    'pt': 'portuguese',
+    'ro': 'romanian',
+    'ru': 'russian',
+    'sv': 'swedish',
+    'tr': 'turkish',
+}
+
+def search_config(language_code):
+    """ Return the PostgreSQL text search configuration for a language code.
+        Regional variants use the configuration of their base language.
+        Unknown languages get the 'simple' configuration, without stemming.
+    """
+    return (SEARCH_CONFIGS.get(language_code) or
+            SEARCH_CONFIGS.get(language_code.split('-')[0]) or
+            'simple')
+
+def search_index(fields, language, **kwargs):
+    """ Build a GIN index matching searches on translations in given language
+        without fallbacks. Fields are names of translated fields. Keyword
+        arguments, including the mandatory index name, are passed to GinIndex.
+        PostgreSQL only.
+    """
+    from django.contrib.postgres.indexes import GinIndex
+    kwargs.setdefault('condition', Q(language_code=language))
+    return GinIndex(search_vector(fields, search_config(language)), **kwargs)
+
+#===============================================================================
+# Internal helpers, used by TranslationQueryset.search()
+
+def search_vector(fields, config):
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector(*fields, config=config)
+
+def search_language_config(languages):
+    """ Build the configuration expression for translations in any of languages """
+    configs = {code: search_config(code) for code in languages}
+    if len(set(configs.values())) == 1:
+        return next(iter(configs.values()))
+    return Case(*(When(language_code=code, then=Value(config))
+                  for code, config in configs.items()),
+                default=Value('simple'), output_field=models.CharField())
+
+def search_filter(queryset, query, fields, languages, rank):
+    """ Filter queryset on translations matching query, using the configuration
+        of languages. Annotate rank under given name unless it is None.
+        Fields must be names on the translations model.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor != 'postgresql':
+        raise NotSupportedError('Full-text search on translations is not supported on %s.'
+                                % vendor)
+    if not query.split():
+        return queryset.none()
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+    config = search_language_config(languages)
+    vector = search_vector(fields, config)
+    search_query = SearchQuery(query, config=config)
+    if django.VERSION >= (3, 2):
+        queryset = QuerySet.alias(queryset, hvad_search_vector=vector)
+    else: # pragma: no cover
+        queryset = QuerySet.annotate(queryset, hvad_search_vector=vector)
+    queryset = QuerySet.filter(queryset, hvad_search_vector=search_query)
+    if rank is not None:
+        queryset = queryset.annotate(**{rank: SearchRank(vector, search_query)})
+    return queryset
@@ -19,6 +19,7 @@ _default_settings = {
     'TABLE_NAME_FORMAT': '%s_translation',
     'AUTOLOAD_TRANSLATIONS': False,
     'USE_DEFAULT_QUERYSET': False,
+    'USE_COLLATIONS': False,
 }
 
 #===============================================================================
@@ -71,6 +72,14 @@ class HvadSettingsChecks:
                                          obj='USE_DEFAULT_QUERYSET', id='hvad.settings.W03'))
         return errors
 
+    @staticmethod
+    def check_USE_COLLATIONS(value):
+        errors = []
+        if not isinstance(value, bool):
+            errors.append(checks.Warning('HVAD["USE_COLLATIONS"] should be True or False',
+                                         obj='USE_COLLATIONS', id='hvad.settings.W04'))
+        return errors
+
 
 @checks.register(checks.Tags.models)
 def check(app_configs, **kwargs):
@@ -1,6 +1,7 @@
 from django.db import models
 from django.template.defaultfilters import slugify
-from hvad.models import TranslatableModel, TranslatedFields
+from hvad.models import (TranslatableModel, TranslatedFields, CompactLanguageCodeField,
+                         LanguageBitmapField)
 from hvad.manager import TranslationManager, TranslationQueryset
 
 
@@ -282,9 +283,21 @@ class AutoPopulated(TranslatableModel):
     translations = TranslatedFields(
         slug = models.SlugField(max_length=255, blank=True),
         translated_name = models.CharField(max_length=255),
+        meta={'indexes': [models.Index(fields=['slug', 'language_code'])]},
     )
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.translated_name[:125])
         super().save(*args, **kwargs)
+
+
+class CompactLanguage(TranslatableModel):
+    """ Model for testing translation table storage options """
+    shared_field = models.CharField(max_length=255)
+    languages = LanguageBitmapField()
+    translations = TranslatedFields(
+        natural_key=True,
+        translated_field = models.CharField(max_length=255),
+        language_code = CompactLanguageCodeField(db_index=True),
+    )
@@ -1,17 +1,19 @@
 import django
 from django.contrib import admin
+from django.contrib.auth.models import Permission, User
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 from django.utils import translation
 from django.http import HttpResponseForbidden, HttpResponseRedirect, QueryDict
 from urllib.parse import urlparse
-from hvad.admin import InlineModelForm
+from hvad.admin import InlineModelForm, TranslatableAdmin
 from hvad.admin import translatable_modelform_factory
 from hvad.forms import TranslatableModelForm
 from hvad.test_utils.fixtures import NormalFixture, UsersFixture
 from hvad.test_utils.data import NORMAL
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, Unique, SimpleRelated, AutoPopulated
+from hvad.test_utils.project.app.models import (Normal, Unique, SimpleRelated, AutoPopulated,
+                                               Related)
 
 
 class BaseAdminTests:
@@ -470,6 +472,75 @@ class AdminNoFixturesTests(HvadTestCase, BaseAdminTests):
         self.assertCountEqual(t.Meta.exclude, ['id', 'translations'])
 
 
+class AdminFormCacheTests(HvadTestCase, BaseAdminTests, UsersFixture):
+    def request(self, username, language='en'):
+        request = self.request_factory.get('/url/', {'language': language})
+        request.user = User.objects.get(username=username)
+        return request
+
+    def test_form_class_cache(self):
+        normaladmin = self._get_admin(Normal)
+        Form = normaladmin.get_form(self.request('admin'))
+        self.assertIs(normaladmin.get_form(self.request('admin')), Form)
+        self.assertEqual(Form.language, 'en')
+
+        # language, user permissions and arguments are part of the key
+        self.assertIsNot(normaladmin.get_form(self.request('admin', 'ja')), Form)
+        self.assertEqual(normaladmin.get_form(self.request('admin', 'ja')).language, 'ja')
+        StaffForm = normaladmin.get_form(self.request('staff'))
+        self.assertIsNot(StaffForm, Form)
+        self.assertIs(normaladmin.get_form(self.request('staff')), StaffForm)
+        staff = User.objects.get(username='staff')
+        staff.user_permissions.add(Permission.objects.get(codename='add_normal'))
+        self.assertIsNot(normaladmin.get_form(self.request('staff')), StaffForm)
+        self.assertIsNot(normaladmin.get_form(self.request('admin'), fields=['shared_field']),
+                         Form)
+
+        # caller-supplied callbacks disable the cache
+        callback = lambda field, **kwargs: field.formfield(**kwargs)
+        self.assertIsNot(normaladmin.get_form(self.request('admin'), formfield_callback=callback),
+                         normaladmin.get_form(self.request('admin'), formfield_callback=callback))
+
+    def test_formfield_override(self):
+        class OverrideAdmin(TranslatableAdmin):
+            def formfield_for_dbfield(self, db_field, request, **kwargs):
+                return super().formfield_for_dbfield(db_field, request, **kwargs)
+        overrideadmin = OverrideAdmin(Normal, admin.site)
+        self.assertIsNot(overrideadmin.get_form(self.request('admin')),
+                         overrideadmin.get_form(self.request('admin')))
+
+        class AutocompleteAdmin(TranslatableAdmin):
+            def get_autocomplete_fields(self, request):
+                return ()
+        autocompleteadmin = AutocompleteAdmin(Normal, admin.site)
+        self.assertIsNot(autocompleteadmin.get_form(self.request('admin')),
+                         autocompleteadmin.get_form(self.request('admin')))
+
+    def test_related_admin_override(self):
+        site = admin.AdminSite(name='hvad_test_cache')
+        relatedadmin = TranslatableAdmin(Related, site)
+        site.register(Normal, TranslatableAdmin)
+        self.assertIs(relatedadmin.get_form(self.request('admin')),
+                      relatedadmin.get_form(self.request('admin')))
+
+        class OrderingAdmin(TranslatableAdmin):
+            def get_ordering(self, request):
+                return ('-shared_field',) if request.user.is_superuser else ()
+        site.unregister(Normal)
+        site.register(Normal, OrderingAdmin)
+        self.assertIsNot(relatedadmin.get_form(self.request('admin')),
+                         relatedadmin.get_form(self.request('admin')))
+
+    def test_formset_class_cache(self):
+        inline = self._get_admin(Normal).get_inline_instances(self.request('admin'))[0]
+        FormSet = inline.get_formset(self.request('admin'))
+        self.assertIs(inline.get_formset(self.request('admin')), FormSet)
+        self.assertIs(inline.get_form(self.request('admin')),
+                      inline.get_form(self.request('admin')))
+        self.assertIsNot(inline.get_formset(self.request('admin', 'ja')), FormSet)
+
+
+
 class AdminRelationTests(HvadTestCase, BaseAdminTests, UsersFixture, NormalFixture):
     normal_count = 1
 
@@ -5,16 +5,19 @@ from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
 from django.db import connection, models, IntegrityError
 from django.db.models.manager import Manager
 from django.db.models.query_utils import Q
+from django.test.testcases import TransactionTestCase
 from django.utils import translation
 from hvad import settings
 from hvad.exceptions import WrongManager
 from hvad.manager import TranslationQueryset
-from hvad.models import TranslatableModel, TranslatedFields
+from hvad.models import TranslatableModel, TranslatedFields, LanguageBitmapField
 from hvad.test_utils.data import NORMAL
 from hvad.test_utils.fixtures import NormalFixture
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, Unique, Related, MultipleFields, Boolean, Standard
+from hvad.test_utils.project.app.models import (Normal, Unique, Related, MultipleFields, Boolean,
+                                               Standard, CompactLanguage)
 from copy import deepcopy
+from unittest import skipUnless
 
 
 class SettingsTests(HvadTestCase):
@@ -65,7 +68,8 @@ class SettingsTests(HvadTestCase):
             self.assertIn(error, settings.check(apps))
 
     def test_boolean_settings(self):
-        for key, err in (('AUTOLOAD_TRANSLATIONS', 'W02'), ('USE_DEFAULT_QUERYSET', 'W03')):
+        for key, err in (('AUTOLOAD_TRANSLATIONS', 'W02'), ('USE_DEFAULT_QUERYSET', 'W03'),
+                         ('USE_COLLATIONS', 'W04')):
             error = checks.Warning('HVAD["%s"] should be True or False' % key,
                                    obj=key, id='hvad.settings.%s' % err)
             with self.settings(HVAD={key: 'foo'}):
@@ -246,6 +250,118 @@ class DefinitionTests(HvadTestCase):
         state = ModelState.from_model(IndexTogetherModel2._meta.translations_model)
         self.assertEqual(state.options['index_together'], {('tfield_a', 'tfield_b')})
 
+    def test_indexes_constraints(self):
+        class IndexesModel(TranslatableModel):
+            sfield_a = models.CharField(max_length=250)
+            sfield_b = models.CharField(max_length=250)
+            translations = TranslatedFields(
+                tfield_a = models.CharField(max_length=250),
+                tfield_b = models.CharField(max_length=250),
+            )
+            class Meta:
+                indexes = [
+                    models.Index(fields=['sfield_a', '-sfield_b']),
+                    models.Index(fields=['language_code', 'tfield_a']),
+                    models.Index(fields=['tfield_a'], condition=models.Q(tfield_b__gt=''),
+                                 name='indexes_partial_tfield_a'),
+                ]
+                constraints = [
+                    models.UniqueConstraint(fields=['sfield_a'], name='indexes_unique_sfield_a'),
+                    models.UniqueConstraint(fields=['tfield_a', 'language_code'],
+                                            condition=~models.Q(tfield_b=models.F('tfield_a')),
+                                            name='indexes_unique_tfield_a'),
+                    models.CheckConstraint(check=models.Q(sfield_b__gte=models.F('sfield_a')),
+                                           name='indexes_check_sfield'),
+                ]
+
+        self.assertFalse(IndexesModel.check())
+        translations_model = IndexesModel._meta.translations_model
+        self.assertFalse(translations_model.check())
+
+        self.assertEqual([index.fields for index in IndexesModel._meta.indexes],
+                         [['sfield_a', '-sfield_b']])
+        self.assertEqual([index.fields for index in translations_model._meta.indexes],
+                         [['language_code', 'tfield_a'], ['tfield_a']])
+        self.assertTrue(all(index.name for index in translations_model._meta.indexes))
+        self.assertEqual([constraint.name for constraint in IndexesModel._meta.constraints],
+                         ['indexes_unique_sfield_a', 'indexes_check_sfield'])
+        self.assertEqual([constraint.name for constraint in translations_model._meta.constraints],
+                         ['indexes_unique_tfield_a'])
+
+        from django.db.migrations.state import ModelState
+        state = ModelState.from_model(IndexesModel)
+        self.assertEqual(len(state.options['indexes']), 1)
+        self.assertEqual(len(state.options['constraints']), 2)
+        state = ModelState.from_model(translations_model)
+        self.assertEqual(len(state.options['indexes']), 2)
+        self.assertEqual(len(state.options['constraints']), 1)
+
+    @skipUnless(django.VERSION >= (3, 2), 'Expression and covering indexes require Django 3.2')
+    def test_indexes_expressions(self):
+        from django.db.models.functions import Lower
+        class ExpressionIndexesModel(TranslatableModel):
+            sfield = models.CharField(max_length=250)
+            translations = TranslatedFields(
+                tfield_a = models.CharField(max_length=250),
+                tfield_b = models.CharField(max_length=250),
+            )
+            class Meta:
+                indexes = [
+                    models.Index(Lower('sfield'), name='expressions_lower_sfield'),
+                    models.Index(Lower('tfield_b'), name='expressions_lower_tfield_b'),
+                    models.Index(fields=['tfield_a'], include=['tfield_b'],
+                                 name='expressions_covering_tfield_a'),
+                ]
+
+        self.assertFalse(ExpressionIndexesModel.check())
+        translations_model = ExpressionIndexesModel._meta.translations_model
+        self.assertFalse(translations_model.check())
+        self.assertEqual([index.name for index in ExpressionIndexesModel._meta.indexes],
+                         ['expressions_lower_sfield'])
+        self.assertEqual([index.name for index in translations_model._meta.indexes],
+                         ['expressions_lower_tfield_b', 'expressions_covering_tfield_a'])
+
+    def test_natural_key(self):
+        class NaturalKeyModel(TranslatableModel):
+            sfield = models.CharField(max_length=250)
+            translations = TranslatedFields(
+                natural_key=True,
+                tfield = models.CharField(max_length=250),
+            )
+
+        translations_model = NaturalKeyModel._meta.translations_model
+        self.assertFalse(NaturalKeyModel.check())
+        self.assertEqual(translations_model._meta.unique_together,
+                         (('master', 'language_code'),))
+        self.assertFalse(translations_model._meta.get_field('master').db_index)
+        self.assertTrue(Normal._meta.translations_model._meta.get_field('master').db_index)
+
+        translation = translations_model(language_code='en', tfield='foo')
+        unique_checks, date_checks = translation._get_unique_checks()
+        self.assertNotIn(('master', 'language_code'),
+                         [fields for model, fields in unique_checks])
+
+    def test_indexes_constraints_invalid(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class InvalidIndexesModel(TranslatableModel):
+                sfield = models.CharField(max_length=250)
+                translations = TranslatedFields(
+                    tfield = models.CharField(max_length=250)
+                )
+                class Meta:
+                    indexes = [models.Index(fields=['sfield', 'tfield'])]
+
+        with self.assertRaises(ImproperlyConfigured):
+            class InvalidConstraintsModel(TranslatableModel):
+                sfield = models.CharField(max_length=250)
+                translations = TranslatedFields(
+                    tfield = models.CharField(max_length=250)
+                )
+                class Meta:
+                    constraints = [models.UniqueConstraint(fields=['tfield'],
+                                                           condition=models.Q(sfield='x'),
+                                                           name='invalid_constraints_tfield')]
+
     def test_abstract_base_model(self):
         class Meta:
             abstract = True
@@ -1090,3 +1206,219 @@ class BooleanTests(HvadTestCase):
         en = Boolean.objects.language('en').get()
         self.assertEqual(en.shared_flag, True)
         self.assertEqual(en.translated_flag, False)
+
+
+class CompactLanguageTests(HvadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = CompactLanguage.objects.language('en').create(shared_field='first',
+                                                                  translated_field='first en')
+        self.first.translate('ja')
+        self.first.translated_field = 'first ja'
+        self.first.save()
+        self.second = CompactLanguage.objects.language('ja').create(shared_field='second',
+                                                                   translated_field='second ja')
+
+    def test_storage(self):
+        table = CompactLanguage._meta.translations_model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT language_code FROM %s WHERE master_id = %%s '
+                           'ORDER BY language_code' % connection.ops.quote_name(table),
+                           [self.first.pk])
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1, 2])
+
+    def test_queries(self):
+        obj = CompactLanguage.objects.language('ja').get(pk=self.first.pk)
+        self.assertEqual(obj.language_code, 'ja')
+        self.assertEqual(obj.translated_field, 'first ja')
+        self.assertEqual(CompactLanguage.objects.language('en').count(), 1)
+        self.assertEqual(CompactLanguage.objects.language('fr').count(), 0)
+        self.assertCountEqual(
+            CompactLanguage.objects.language('all').values_list('language_code', flat=True),
+            ['en', 'ja', 'ja'])
+        self.assertCountEqual(self.first.translations.all_languages(), ['en', 'ja'])
+
+        qs = CompactLanguage.objects.language('en').fallbacks('ja').order_by('shared_field')
+        self.assertEqual([(obj.language_code, obj.translated_field) for obj in qs],
+                         [('en', 'first en'), ('ja', 'second ja')])
+
+        obj = CompactLanguage.objects.untranslated().get(pk=self.second.pk)
+        self.assertEqual(obj.translations.get_language('ja').translated_field, 'second ja')
+
+    def test_invalid_language(self):
+        with self.assertRaises(ValueError):
+            CompactLanguage.objects.language('fr').create(shared_field='invalid')
+
+    def test_checks(self):
+        field = CompactLanguage._meta.translations_model._meta.get_field('language_code')
+        self.assertFalse(field.check())
+        with self.settings(HVAD={'LANGUAGES': (('en', 'English'), ('ja', 'Japanese'),
+                                               ('fr', 'French'))}):
+            self.assertEqual([error.id for error in field.check()], ['hvad.models.E03'])
+
+        name, path, args, kwargs = field.deconstruct()
+        self.assertEqual(path, 'hvad.models.CompactLanguageCodeField')
+        self.assertEqual(kwargs, {'db_index': True, 'languages': ['en', 'ja']})
+
+
+class LanguageBitmapTests(HvadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.obj = CompactLanguage.objects.language('en').create(shared_field='first',
+                                                                translated_field='first en')
+        self.field = CompactLanguage._meta.get_field('languages')
+
+    def stored(self, obj=None):
+        obj = obj or self.obj
+        value = CompactLanguage.objects.untranslated().values_list('languages', flat=True)
+        return self.field.get_languages(value.get(pk=obj.pk))
+
+    def test_save(self):
+        self.assertEqual(self.stored(), {'en'})
+        stale = CompactLanguage.objects.untranslated().get(pk=self.obj.pk)
+        self.obj.translate('ja')
+        self.obj.translated_field = 'first ja'
+        self.obj.save()
+        self.assertEqual(self.obj.languages, 3)
+        self.assertEqual(self.stored(), {'en', 'ja'})
+
+        # saving an instance loaded before the new translation keeps its bit
+        stale.shared_field = 'changed'
+        stale.save()
+        self.assertEqual(self.stored(), {'en', 'ja'})
+
+        obj = CompactLanguage.objects.language('ja').get(pk=self.obj.pk)
+        obj.translated_field = 'changed'
+        obj.save(update_fields=['translated_field'])
+        self.assertEqual(self.stored(), {'en', 'ja'})
+
+    def test_save_stale(self):
+        # saving an instance never writes its in-memory bits
+        self.obj.translate('ja')
+        self.obj.translated_field = 'first ja'
+        self.obj.save()
+        stale = CompactLanguage.objects.untranslated().get(pk=self.obj.pk)
+        self.assertEqual(self.field.get_languages(stale.languages), {'en', 'ja'})
+        CompactLanguage.objects.language('ja').filter(pk=self.obj.pk).delete_translations()
+
+        stale.shared_field = 'changed'
+        stale.save()
+        self.assertEqual(self.stored(), {'en'})
+
+        stale.languages = 0
+        stale.save()
+        self.assertEqual(self.stored(), {'en'})
+
+    def test_save_deferred(self):
+        CompactLanguage.objects.language('ja').filter(pk=self.obj.pk).delete_translations()
+        obj = CompactLanguage.objects.untranslated().defer('languages').get(pk=self.obj.pk)
+        obj.translate('ja')
+        obj.translated_field = 'first ja'
+        obj.save(update_fields=['translated_field'])
+        self.assertNotIn('languages', obj.__dict__)
+        self.assertEqual(self.stored(), {'en', 'ja'})
+
+    def test_all_languages(self):
+        obj = CompactLanguage.objects.untranslated().get(pk=self.obj.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(obj.translations.all_languages(), {'en'})
+        obj = CompactLanguage.objects.untranslated().only('shared_field').get(pk=self.obj.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(obj.translations.all_languages(), {'en'})
+
+    def test_delete(self):
+        self.obj.translate('ja')
+        self.obj.save()
+        self.obj.translations.get_language('en').delete()
+        self.assertEqual(self.stored(), {'ja'})
+
+        other = CompactLanguage.objects.language('ja').create(shared_field='second')
+        CompactLanguage.objects.language('ja').filter(pk=self.obj.pk).delete_translations()
+        self.assertEqual(self.stored(), set())
+        self.assertEqual(self.stored(other), {'ja'})
+
+    def test_delete_chunked(self):
+        self.obj.translate('ja')
+        self.obj.save()
+        other = CompactLanguage.objects.language('ja').create(shared_field='second')
+        deleted = CompactLanguage.objects.language('ja').delete_translations(chunk_size=1)
+        self.assertEqual(deleted, 2)
+        self.assertEqual(self.stored(), {'en'})
+        self.assertEqual(self.stored(other), set())
+
+    def test_update_language(self):
+        CompactLanguage.objects.language('en').update(language_code='ja')
+        self.assertEqual(self.stored(), {'ja'})
+        CompactLanguage.objects.language('ja').update(translated_field='changed')
+        self.assertEqual(self.stored(), {'ja'})
+
+    def test_lookup_rebuild(self):
+        other = CompactLanguage.objects.language('ja').create(shared_field='second')
+        qs = CompactLanguage.objects.untranslated()
+        self.assertEqual(list(qs.filter(languages__has_language='ja')), [other])
+        self.assertEqual(list(qs.filter(languages__has_language='fr')), [])
+
+        qs.update(languages=0)
+        self.assertEqual(self.field.rebuild(qs.filter(pk=self.obj.pk)), 1)
+        self.assertEqual(self.stored(), {'en'})
+        self.assertEqual(self.stored(other), set())
+
+    def test_checks(self):
+        self.assertFalse(self.field.check())
+        with self.settings(HVAD={'LANGUAGES': (('en', 'English'), ('ja', 'Japanese'),
+                                               ('fr', 'French'))}):
+            self.assertEqual([error.id for error in self.field.check()], ['hvad.models.E04'])
+
+        name, path, args, kwargs = self.field.deconstruct()
+        self.assertEqual(path, 'hvad.models.LanguageBitmapField')
+        self.assertEqual(kwargs, {'languages': ['en', 'ja']})
+        self.assertRaises(ValueError, LanguageBitmapField, languages=range(64))
+
+
+class CompactLanguageMigrationTests(TransactionTestCase):
+    def test_operation(self):
+        from django.db.migrations.state import ModelState, ProjectState
+        from hvad.operations import CompactLanguageCode
+
+        state = ProjectState()
+        state.add_model(ModelState('app', 'CompactMigration', [
+            ('id', models.AutoField(primary_key=True)),
+            ('language_code', models.CharField(max_length=15, db_index=True)),
+        ]))
+        operation = CompactLanguageCode('CompactMigration', languages=['en', 'ja'],
+                                        db_index=True)
+        new_state = state.clone()
+        operation.state_forwards('app', new_state)
+
+        with connection.schema_editor() as editor:
+            editor.create_model(state.apps.get_model('app', 'CompactMigration'))
+        try:
+            old_model = state.apps.get_model('app', 'CompactMigration')
+            old_model.objects.bulk_create([old_model(language_code='ja'),
+                                           old_model(language_code='en')])
+
+            with connection.schema_editor() as editor:
+                operation.database_forwards('app', editor, state, new_state)
+            new_model = new_state.apps.get_model('app', 'CompactMigration')
+            self.assertEqual(list(new_model.objects.order_by('pk')
+                                                   .values_list('language_code', flat=True)),
+                             ['ja', 'en'])
+            self.assertEqual(new_model.objects.filter(language_code='en').count(), 1)
+
+            with connection.schema_editor() as editor:
+                operation.database_backwards('app', editor, new_state, state)
+            self.assertEqual(list(old_model.objects.order_by('pk')
+                                                   .values_list('language_code', flat=True)),
+                             ['ja', 'en'])
+
+            old_model.objects.create(language_code='fr')
+            with self.assertRaises(ValueError):
+                with connection.schema_editor() as editor:
+                    operation.database_forwards('app', editor, state, new_state)
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(old_model)
+
+        name, args, kwargs = operation.deconstruct()
+        self.assertEqual(kwargs, {'model_name': 'CompactMigration',
+                                  'languages': ['en', 'ja'], 'db_index': True})
@@ -0,0 +1,120 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, models
+from hvad.models import TranslatableModel, TranslatedFields
+from hvad.manager import LanguageCoverage
+from hvad.test_utils.data import NormalData
+from hvad.test_utils.fixtures import NormalFixture
+from hvad.test_utils.project.app.models import CompactLanguage, Normal
+from hvad.test_utils.testcase import HvadTestCase
+from hvad.management.commands.hvad_indexes import get_candidates, HIGH, MEDIUM
+
+#===============================================================================
+
+class IndexAdvisorTests(HvadTestCase):
+    def call(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('hvad_indexes', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue()
+
+    def test_report(self):
+        output = self.call('app')
+        self.assertIn('-- [high] app.NormalTranslation: fallbacks self-join', output)
+        statements = [line for line in output.splitlines() if 'app_normal_translation' in line]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('"master_id", "language_code", "id"', statements[0].replace('`', '"'))
+
+        with connection.cursor() as cursor:
+            cursor.execute(statements[0].rstrip(';'))
+        output = self.call('app')
+        self.assertNotIn('app_normal_translation', output)
+        self.assertIn('app_unique_translation', output)
+
+    def test_invalid_app(self):
+        self.assertRaises(CommandError, self.call, 'nonexistent')
+
+    def test_candidates(self):
+        class IndexAdvisorModel(TranslatableModel):
+            sfield = models.CharField(max_length=250)
+            translations = TranslatedFields(
+                tfield_a = models.CharField(max_length=250),
+                tfield_b = models.CharField(max_length=250),
+            )
+            class Meta:
+                ordering = ['-tfield_a', 'tfield_b', 'sfield']
+
+        candidates = get_candidates(IndexAdvisorModel)
+        self.assertEqual([(item.priority, item.fields) for item in candidates], [
+            (HIGH, ('master', 'language_code', 'id')),
+            (MEDIUM, ('language_code', 'tfield_a', 'tfield_b')),
+        ])
+        self.assertTrue(all(item.model is IndexAdvisorModel._meta.translations_model
+                            for item in candidates))
+
+    def test_candidates_natural_key(self):
+        # unique (master, language_code) index serves the self-join already
+        self.assertEqual(get_candidates(CompactLanguage), [])
+        self.assertNotIn('app_compactlanguage_translation', self.call('app'))
+
+
+class CoverageTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.english = self.create_normal(NormalData('Shared3', {'en': ''}), ['en'])
+
+    def call(self, *args):
+        stdout = StringIO()
+        call_command('hvad_coverage', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_coverage(self):
+        with self.assertNumQueries(2):
+            coverage = Normal.objects.translation_coverage()
+        self.assertEqual(coverage.total, 3)
+        self.assertEqual(coverage.languages, {
+            'en': LanguageCoverage(3, 0, {'translated_field': 1}),
+            'ja': LanguageCoverage(2, 1, {'translated_field': 0}),
+        })
+        coverage = Normal.objects.translation_coverage(['ja', 'th'])
+        self.assertEqual(list(coverage.languages), ['ja', 'th'])
+        self.assertEqual(coverage.languages['th'], LanguageCoverage(0, 3, {'translated_field': 0}))
+
+    def test_coverage_cache(self):
+        cache.clear()
+        Normal.objects.translation_coverage(cache_timeout=60)
+        with self.assertNumQueries(0):
+            coverage = Normal.objects.translation_coverage(cache_timeout=60)
+        self.assertEqual(coverage.languages['ja'].missing, 1)
+
+    def test_missing_translations(self):
+        self.assertEqual(list(Normal.objects.missing_translations('ja')), [self.english])
+        self.assertEqual(list(Normal.objects.missing_translations('en')), [])
+
+    def test_command(self):
+        output = self.call('app', '--language=en', '--language=ja', '--missing')
+        self.assertIn('app.Normal: 3 objects\n'
+                      '  en: 3 translated, 0 missing, empty: translated_field=1\n'
+                      '  ja: 2 translated, 1 missing\n'
+                      '    - %d\n' % self.english.pk, output)
+        output = self.call('app', '--language=ja')
+        self.assertIn('app.Normal: 3 objects\n  ja: 2 translated, 1 missing\n', output)
+
+    def test_invalid_app(self):
+        self.assertRaises(CommandError, self.call, 'nonexistent')
+
+
+class LanguageBitmapCommandTests(HvadTestCase):
+    def test_command(self):
+        obj = CompactLanguage.objects.language('ja').create(shared_field='shared')
+        CompactLanguage.objects.untranslated().update(languages=0)
+        stdout = StringIO()
+        call_command('hvad_language_bitmaps', 'app', stdout=stdout)
+        self.assertIn('app.CompactLanguage.languages: 1 objects', stdout.getvalue())
+        self.assertEqual(CompactLanguage.objects.untranslated().get(pk=obj.pk).languages, 2)
+
+    def test_invalid_app(self):
+        self.assertRaises(CommandError, call_command, 'hvad_language_bitmaps', 'nonexistent')
@@ -1,12 +1,26 @@
+import json
+from unittest import mock
+from django.db import connection
 from django.utils import translation
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.request import Request
 from rest_framework.serializers import ModelSerializer, CharField
+from rest_framework.test import APIRequestFactory
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, Related, TranslatedMany, Unique
+from hvad.utils import bulk_create_translations
+from hvad.test_utils.project.app.models import (Normal, Related, TranslatedMany, Unique,
+                                               CompactLanguage, AutoPopulated)
 from hvad.test_utils.data import NORMAL
 from hvad.test_utils.fixtures import NormalFixture
 from hvad.contrib.restframework import (TranslationsMixin,
-                                        TranslatableModelSerializer)
+                                        NestedTranslationSerializer,
+                                        TranslatableListSerializer,
+                                        TranslatableModelSerializer,
+                                        TranslatableCursorPagination)
+from hvad.contrib.restframework.filters import TranslatableFilterBackend
 from hvad.contrib.restframework.serializers import TranslationListSerializer
+from hvad.contrib.restframework.streaming import StreamingJSONRenderer, StreamingListModelMixin
 
 # =============================================================================
 
@@ -66,6 +80,28 @@ class CustomSerializer(TranslationsMixin, ModelSerializer):
         translations_serializer = CustomTranslationSerializer
 
 
+class LanguageField(CharField):
+    'Renders the active language, flagging itself as localized'
+    localize = True
+
+    def to_representation(self, value):
+        return translation.get_language()
+
+
+class LocalizedTranslationSerializer(NestedTranslationSerializer):
+    active = LanguageField(source='translated_field')
+
+    class Meta:
+        exclude = ()
+
+
+class LocalizedSerializer(TranslationsMixin, ModelSerializer):
+    class Meta:
+        model = Normal
+        exclude = []
+        translations_serializer = LocalizedTranslationSerializer
+
+
 class RelatedSerializer(TranslatableModelSerializer):
     class Meta:
         model = Related
@@ -143,6 +179,31 @@ class TranslatableModelSerializerTests(HvadTestCase, NormalFixture):
         self.assertEqual(data['translated_field'], '')
         self.assertEqual(data['language_code'], 'xx')
 
+    def test_serialize_many(self):
+        'Serialize a list, loading translations in a single query'
+        qs = Normal.objects.untranslated().order_by('pk')
+        serializer = AutoSerializer(instance=qs, many=True, language='ja')
+        self.assertIsInstance(serializer, TranslatableListSerializer)
+        with self.assertNumQueries(2):
+            data = serializer.data
+        self.assertEqual([item['translated_field'] for item in data],
+                         [NORMAL[1].translated_field['ja'], NORMAL[2].translated_field['ja']])
+        self.assertEqual([item['language_code'] for item in data], ['ja', 'ja'])
+
+        objs = list(Normal.objects.untranslated().order_by('pk'))
+        with translation.override('en'), self.assertNumQueries(1):
+            data = AutoSerializer(instance=objs, many=True).data
+        self.assertEqual([item['translated_field'] for item in data],
+                         [NORMAL[1].translated_field['en'], NORMAL[2].translated_field['en']])
+
+        objs = list(Normal.objects.language('ja').order_by('pk'))
+        with self.assertNumQueries(0):
+            data = AutoSerializer(instance=objs, many=True).data
+        self.assertEqual([item['language_code'] for item in data], ['ja', 'ja'])
+        with self.assertNumQueries(1):
+            data = AutoSerializer(instance=objs, many=True, language='xx').data
+        self.assertEqual([item['translated_field'] for item in data], ['', ''])
+
     def test_serialize_related(self):
         'Serialize relation fields'
         obj = Related(pk=42, language_code='ja',
@@ -319,6 +380,15 @@ class TranslationsMixinTests(HvadTestCase, NormalFixture):
         self.assertCountEqual(
             serializer.fields['translations'].child.fields, ['cheat', 'custom'])
 
+    def test_nested_serializer_cache(self):
+        'Nested serializer classes are built once per serializer class'
+        first = TranslationsSerializer().fields['translations'].child
+        second = TranslationsSerializer(instance=Normal()).fields['translations'].child
+        self.assertIs(first.__class__, second.__class__)
+        custom = CustomSerializer().fields['translations'].child
+        self.assertIsNot(first.__class__, custom.__class__)
+        self.assertIsInstance(custom, CustomTranslationSerializer)
+
     # ---------------------------------------------------------------------
 
     def test_serialize(self):
@@ -339,6 +409,31 @@ class TranslationsMixinTests(HvadTestCase, NormalFixture):
             self.assertEqual(
                 translation['translated_field'], NORMAL[1].translated_field[language])
 
+    def test_serialize_many(self):
+        'Serialize nested translations of a list in a single query'
+        objs = list(Normal.objects.untranslated().order_by('pk'))
+        serializer = TranslationsSerializer(instance=objs, many=True)
+        self.assertIsInstance(serializer, TranslatableListSerializer)
+        with self.assertNumQueries(1):
+            data = serializer.data
+        for item, obj_data in zip(data, (NORMAL[1], NORMAL[2])):
+            self.assertEqual({language: value['translated_field']
+                              for language, value in item['translations'].items()},
+                             {language: obj_data.translated_field[language]
+                              for language in self.translations})
+
+    def test_serialize_language(self):
+        'Translations are serialized with their language active only if fields are localized'
+        obj = Normal.objects.prefetch_related('translations').get(pk=self.normal_id[1])
+        with translation.override('en'):
+            serializer = TranslationsSerializer(instance=obj)
+            self.assertFalse(serializer.fields['translations'].localized)
+            data = LocalizedSerializer(instance=obj).data
+            self.assertEqual(translation.get_language(), 'en')
+        self.assertEqual({language: value['active']
+                          for language, value in data['translations'].items()},
+                         {language: language for language in self.translations})
+
     def test_serialize_custom(self):
         'Serialize nested translations as a language => fields dict'
         obj = Normal.objects.prefetch_related(
@@ -460,6 +555,133 @@ class TranslationsMixinTests(HvadTestCase, NormalFixture):
         self.assertCountEqual([(item.language_code, item.translated_field) for item in qs],
                               [('en', 'English'), ('sr', 'српски')])
 
+    def test_update_many_languages(self):
+        'Update many translations with a fixed number of queries'
+        obj = Normal.objects.untranslated().get(pk=self.normal_id[1])
+        languages = ['en', 'ja', 'sr', 'fr', 'de', 'it', 'es', 'pt', 'nl', 'sv']
+        data = {
+            'shared_field': 'shared',
+            'translations': {code: {'translated_field': 'text %s' % code} for code in languages},
+        }
+        serializer = TranslationsSerializer(instance=obj, data=data)
+        self.assertTrue(serializer.is_valid())
+
+        # update shared, update "en", update "ja", insert others, delete others
+        with self.assertNumQueries(5):
+            obj = serializer.save()
+        qs = Normal.objects.language('all').filter(pk=self.normal_id[1])
+        self.assertCountEqual([(item.language_code, item.translated_field) for item in qs],
+                              [(code, 'text %s' % code) for code in languages])
+
+        data = {'translations': {'en': {'translated_field': 'English'}}}
+        serializer = TranslationsSerializer(instance=obj, data=data, partial=True)
+        self.assertTrue(serializer.is_valid())
+        with self.assertNumQueries(2):  # update shared, update "en"
+            obj = serializer.save()
+        self.assertCountEqual(obj.translations.all_languages(), languages)
+
+    def test_update_translation_override(self):
+        'Overriding update_translation saves translations one by one through it'
+        class SerializerClass(TranslationsSerializer):
+            def update_translation(self, instance, data):
+                data['translated_field'] += '!'
+                return super().update_translation(instance, data)
+
+        obj = Normal.objects.untranslated().get(pk=self.normal_id[1])
+        data = {
+            'shared_field': 'shared',
+            'translations': {
+                'en': {'translated_field': 'English'},
+                'ja': {'translated_field': 'Japanese'},
+                'sr': {'translated_field': 'српски'},
+            },
+        }
+        serializer = SerializerClass(instance=obj, data=data)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        qs = Normal.objects.language('all').filter(pk=self.normal_id[1])
+        self.assertCountEqual([(item.language_code, item.translated_field) for item in qs],
+                              [('en', 'English'), ('ja', 'Japanese!'), ('sr', 'српски!')])
+
+    def test_create_pks(self):
+        'New nested translations get their primary key, whatever the backend'
+        data = {
+            'shared_field': 'shared',
+            'translations': {
+                'en': {'translated_field': 'English'},
+                'ja': {'translated_field': 'Japanese'},
+                'sr': {'translated_field': 'српски'},
+            },
+        }
+        for can_return in (True, False):
+            serializer = TranslationsSerializer(data=data)
+            self.assertTrue(serializer.is_valid())
+            with mock.patch.object(type(connection.features),
+                                   'can_return_rows_from_bulk_insert', can_return), \
+                 mock.patch('hvad.contrib.restframework.serializers.bulk_create_translations',
+                            wraps=bulk_create_translations) as bulk_create:
+                obj = serializer.save()
+            created = bulk_create.call_args[0][1]
+            self.assertCountEqual([item.language_code for item in created], ['ja', 'sr'])
+            for item in created:
+                self.assertEqual(item.pk, obj.translations.get(language_code=item.language_code).pk)
+
+    def test_save_translations_vetoed(self):
+        'Reserved fields are rejected from nested translation data'
+        obj = Normal.objects.untranslated().get(pk=self.normal_id[1])
+        serializer = TranslationsSerializer(instance=obj)
+        for name in ('id', 'master', 'master_id', 'language_code'):
+            with self.assertRaises(KeyError):
+                serializer.save_translations(obj, {'de': {name: 1}}, {})
+        self.assertCountEqual(obj.translations.all_languages(), ('en', 'ja'))
+
+    def test_custom_save(self):
+        'Models with a custom save() have it called for every translation'
+        class SerializerClass(TranslationsMixin, ModelSerializer):
+            class Meta:
+                model = AutoPopulated
+                exclude = []
+
+        data = {
+            'translations': {
+                'en': {'translated_name': 'Apple fruit'},
+                'ja': {'translated_name': 'Ringo fruit'},
+            },
+        }
+        serializer = SerializerClass(data=data)
+        self.assertTrue(serializer.is_valid())
+        obj = serializer.save()
+        qs = AutoPopulated.objects.language('all').filter(pk=obj.pk)
+        self.assertCountEqual(qs.values_list('language_code', 'slug'),
+                              [('en', 'apple-fruit'), ('ja', 'ringo-fruit')])
+
+    def test_language_bitmap(self):
+        'Nested translation writes keep language bitmaps up to date'
+        class SerializerClass(TranslationsMixin, ModelSerializer):
+            class Meta:
+                model = CompactLanguage
+                exclude = []
+
+        data = {
+            'shared_field': 'shared',
+            'translations': {'en': {'translated_field': 'English'},
+                             'ja': {'translated_field': 'Japanese'}},
+        }
+        serializer = SerializerClass(data=data)
+        self.assertTrue(serializer.is_valid())
+        obj = serializer.save()
+        self.assertEqual(obj.languages, 3)
+        self.assertEqual(CompactLanguage.objects.untranslated().get(pk=obj.pk).languages, 3)
+
+        serializer = SerializerClass(instance=obj, data={
+            'shared_field': 'shared',
+            'translations': {'en': {'translated_field': 'English'}},
+        })
+        self.assertTrue(serializer.is_valid())
+        obj = serializer.save()
+        self.assertEqual(obj.languages, 1)
+        self.assertEqual(CompactLanguage.objects.untranslated().get(pk=obj.pk).languages, 1)
+
     def test_update_partial(self):
         'Update an existing instance, but just some fields'
         obj = Normal.objects.untranslated().get(pk=self.normal_id[1])
@@ -552,6 +774,14 @@ class CombinedTests(HvadTestCase, NormalFixture):
             self.assertEqual(
                 translation['translated_field'], NORMAL[1].translated_field[language])
 
+    def test_serialize_many(self):
+        'Translated fields of a list come from prefetched nested translations'
+        objs = list(Normal.objects.untranslated())
+        with self.assertNumQueries(1):
+            data = CombinedSerializer(instance=objs, many=True, language='ja').data
+        self.assertEqual(data[0]['translated_field'], NORMAL[1].translated_field['ja'])
+        self.assertCountEqual(data[0]['translations'], self.translations)
+
     # ---------------------------------------------------------------------
 
     def test_create_translations(self):
@@ -675,3 +905,156 @@ class CombinedTests(HvadTestCase, NormalFixture):
 
         serializer = CombinedUniqueSerializer(data=data)
         self.assertFalse(serializer.is_valid())
+
+#=============================================================================
+
+class PaginationTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    class Pagination(TranslatableCursorPagination):
+        ordering = ['-translated_field']
+        page_size = 1
+
+    def test_paginate(self):
+        factory = APIRequestFactory()
+        qs = Normal.objects.language('ja').fallbacks('en')
+        paginator = self.Pagination()
+
+        request = Request(factory.get('/normal/'))
+        page = paginator.paginate_queryset(qs, request)
+        self.assertEqual([obj.pk for obj in page], [self.normal_id[2]])
+        self.assertIsNone(paginator.get_previous_link())
+        self.assertTrue(paginator.display_page_controls)
+        response = paginator.get_paginated_response([obj.translated_field for obj in page])
+        self.assertEqual(response.data['results'], [NORMAL[2].translated_field['ja']])
+
+        request = Request(factory.get(response.data['next']))
+        page = paginator.paginate_queryset(qs, request)
+        self.assertEqual([obj.pk for obj in page], [self.normal_id[1]])
+        self.assertIsNone(paginator.get_next_link())
+
+        request = Request(factory.get(paginator.get_previous_link()))
+        page = paginator.paginate_queryset(qs, request)
+        self.assertEqual([obj.pk for obj in page], [self.normal_id[2]])
+
+        request = Request(factory.get('/normal/', {'cursor': 'invalid'}))
+        self.assertRaises(NotFound, paginator.paginate_queryset, qs, request)
+
+    def test_ordering_required(self):
+        class Pagination(TranslatableCursorPagination):
+            page_size = 1
+        request = Request(APIRequestFactory().get('/normal/'))
+        self.assertRaises(AssertionError, Pagination().paginate_queryset,
+                          Normal.objects.language('en'), request)
+
+# =============================================================================
+
+
+class StreamingTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    class View(StreamingListModelMixin, GenericAPIView):
+        serializer_class = AutoSerializer
+        stream_chunk_size = 1
+
+        def get_queryset(self):
+            return Normal.objects.untranslated().order_by('pk')
+
+        def get(self, request, *args, **kwargs):
+            return self.list(request, *args, **kwargs)
+
+    def test_stream(self):
+        request = APIRequestFactory().get('/normal/')
+        with translation.override('ja'):
+            response = self.View.as_view()(request)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            # one query for objects, then one per chunk for translations
+            with self.assertNumQueries(3):
+                data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['id'] for item in data], [self.normal_id[1], self.normal_id[2]])
+        self.assertEqual([item['translated_field'] for item in data],
+                         [NORMAL[1].translated_field['ja'], NORMAL[2].translated_field['ja']])
+
+    def test_stream_translated(self):
+        view = self.View(request=Request(APIRequestFactory().get('/normal/')), format_kwarg=None)
+        with self.assertNumQueries(1):
+            data = list(view.stream_data(Normal.objects.language('en').order_by('pk')))
+        self.assertEqual([item['language_code'] for item in data], ['en', 'en'])
+
+    def test_render_stream(self):
+        renderer = StreamingJSONRenderer()
+        self.assertEqual(b''.join(renderer.render_stream(iter([]))), b'[]')
+        self.assertEqual(json.loads(b''.join(renderer.render_stream(({'a': n} for n in range(3))))),
+                         [{'a': 0}, {'a': 1}, {'a': 2}])
+
+# =============================================================================
+
+
+class FilterTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    class View(ListAPIView):
+        serializer_class = AutoSerializer
+        filter_backends = [TranslatableFilterBackend]
+        translation_filter_fields = {'translated_field': ['exact', 'icontains'],
+                                     'id': ['exact', 'in']}
+        translation_ordering_fields = ['translated_field', 'shared_field']
+        ordering = ['pk']
+
+        def get_queryset(self):
+            return Normal.objects.language()
+
+    def get(self, params, **headers):
+        request = APIRequestFactory().get('/normal/', params, **headers)
+        return self.View.as_view()(request)
+
+    def test_language(self):
+        response = self.get({'language': 'ja'})
+        self.assertEqual([item['translated_field'] for item in response.data],
+                         [NORMAL[1].translated_field['ja'], NORMAL[2].translated_field['ja']])
+        response = self.get({}, HTTP_ACCEPT_LANGUAGE='ja')
+        self.assertEqual([item['language_code'] for item in response.data], ['ja', 'ja'])
+        response = self.get({'language': 'xx'}, HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual([item['language_code'] for item in response.data], ['en', 'en'])
+
+    def test_fallbacks(self):
+        Normal.objects.language('ja').filter(pk=self.normal_id[1]).delete_translations()
+        response = self.get({'language': 'ja'})
+        self.assertEqual([item['id'] for item in response.data], [self.normal_id[2]])
+
+        class View(self.View):
+            translation_fallbacks = ['en']
+        request = APIRequestFactory().get('/normal/', {'language': 'ja'})
+        response = View.as_view()(request)
+        self.assertEqual([item['language_code'] for item in response.data], ['en', 'ja'])
+
+    def test_filter(self):
+        with self.assertNumQueries(1):
+            response = self.get({'language': 'en',
+                                 'translated_field': NORMAL[2].translated_field['en']})
+        self.assertEqual([item['id'] for item in response.data], [self.normal_id[2]])
+
+        value = NORMAL[1].translated_field['ja'][1:].upper()
+        response = self.get({'language': 'ja', 'translated_field__icontains': value,
+                             'shared_field': 'ignored'})
+        self.assertEqual([item['id'] for item in response.data], [self.normal_id[1]])
+
+        response = self.get({'id__in': '%d,%d' % (self.normal_id[2], -1)})
+        self.assertEqual([item['id'] for item in response.data], [self.normal_id[2]])
+        response = self.get({'id': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ordering(self):
+        response = self.get({'language': 'en', 'ordering': '-translated_field,unknown'})
+        self.assertEqual([item['id'] for item in response.data],
+                         [self.normal_id[2], self.normal_id[1]])
+        response = self.get({'language': 'en', 'ordering': 'unknown'})
+        self.assertEqual([item['id'] for item in response.data],
+                         [self.normal_id[1], self.normal_id[2]])
+
+    def test_schema(self):
+        names = [item['name'] for item in
+                 TranslatableFilterBackend().get_schema_operation_parameters(self.View())]
+        self.assertEqual(names, ['language', 'translated_field', 'translated_field__icontains',
+                                 'id', 'id__in', 'ordering'])
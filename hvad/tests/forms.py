@@ -1,9 +1,11 @@
 from django.core.exceptions import FieldError
 from django.utils import translation
-from hvad.forms import (TranslatableModelForm,
-                        translatable_modelform_factory, translatable_modelformset_factory)
+from django.forms.models import BaseInlineFormSet
+from hvad.forms import (TranslatableModelForm, TranslatableModelFormSetMixin,
+                        translatable_modelform_factory, translatable_modelformset_factory,
+                        translatable_inlineformset_factory)
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, SimpleRelated, Standard
+from hvad.test_utils.project.app.models import Normal, Related, SimpleRelated, Standard
 from hvad.test_utils.data import NORMAL
 from hvad.test_utils.fixtures import NormalFixture
 from django import forms
@@ -554,3 +556,33 @@ class FormsetTests(HvadTestCase, NormalFixture):
     def test_unknown_argument(self):
         self.assertRaises(TypeError, translatable_modelformset_factory,
                           'en', Normal, nonexistent='dummy')
+
+
+class FormsetTranslationLoadingTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    def test_load_translations(self):
+        FormSet = translatable_modelformset_factory('ja', Normal, form=NormalForm, extra=0)
+        self.assertTrue(issubclass(FormSet, TranslatableModelFormSetMixin))
+        queryset = Normal.objects.untranslated().order_by('pk')
+        with self.assertNumQueries(2):
+            formset = FormSet(queryset=queryset)
+            self.assertEqual([form.initial['translated_field'] for form in formset.forms],
+                             [NORMAL[1].translated_field['ja'], NORMAL[2].translated_field['ja']])
+
+        # translations already loaded in the right language need no query
+        queryset = Normal.objects.language('ja').order_by('pk')
+        with self.assertNumQueries(1):
+            formset = FormSet(queryset=queryset)
+            self.assertEqual(len(formset.forms), 2)
+
+    def test_inline(self):
+        parent = Normal.objects.untranslated().get(pk=self.normal_id[1])
+        for index in range(3):
+            Related.objects.language('en').create(normal=parent, translated=parent)
+        FormSet = translatable_inlineformset_factory('en', Normal, Related, fields=['translated'],
+                                                     extra=0, formset=BaseInlineFormSet)
+        with self.assertNumQueries(2):
+            formset = FormSet(instance=parent)
+            self.assertEqual([form.initial['translated'] for form in formset.forms],
+                             [parent.pk] * 3)
@@ -1,9 +1,12 @@
+from unittest import mock
+from django.db import connection
+from django.db.models.signals import post_save
 from django.forms import ModelForm
 from django.utils import translation
 from hvad.admin import TranslatableModelAdminMixin
 from hvad.forms import translatable_inlineformset_factory, translationformset_factory
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, Related
+from hvad.test_utils.project.app.models import AutoPopulated, Normal, Related, Unique
 from hvad.test_utils.fixtures import NormalFixture
 from hvad.test_utils.data import NORMAL
 from hvad.test_utils.forms import FormData
@@ -128,3 +131,194 @@ class TestTranslationsInline(HvadTestCase, NormalFixture):
         obj = Normal.objects.language('de').get(pk=instance.pk)
         self.assertEqual(obj.shared_field, NORMAL[1].shared_field)
         self.assertEqual(obj.translated_field, 'Deutsch')
+
+    def test_save_queries(self):
+        instance = Normal.objects.language('en').get(pk=self.normal_id[1])
+        Formset = translationformset_factory(Normal, extra=2, exclude=[])
+
+        initial = Formset(instance=instance)
+        data = FormData(initial)
+        data.set_formset_field(initial, 0, 'translated_field', 'updated_en')
+        data.set_formset_field(initial, 1, 'translated_field', 'updated_ja')
+        data.set_formset_field(initial, 2, 'language_code', 'de')
+        data.set_formset_field(initial, 2, 'translated_field', 'Deutsch')
+        data.set_formset_field(initial, 3, 'language_code', 'fr')
+        data.set_formset_field(initial, 3, 'translated_field', 'Français')
+
+        formset = Formset(data=data, instance=instance)
+        self.assertTrue(formset.is_valid())
+        with self.assertNumQueries(3):     # master, updated translations, new translations
+            formset.save()
+
+        self.assertCountEqual(instance.translations.all_languages(), ('en', 'ja', 'de', 'fr'))
+        for language, value in (('en', 'updated_en'), ('ja', 'updated_ja'),
+                                ('de', 'Deutsch'), ('fr', 'Français')):
+            obj = Normal.objects.language(language).get(pk=instance.pk)
+            self.assertEqual(obj.translated_field, value)
+
+    def test_save_new_pks(self):
+        # new translations are returned saved, whatever the backend
+        instance = Normal.objects.language('en').get(pk=self.normal_id[1])
+        Formset = translationformset_factory(Normal, extra=2, exclude=[])
+        for can_return in (True, False):
+            Normal.objects.language('all').filter(pk=instance.pk, language_code__in=('de', 'fr')
+                                                  ).delete_translations()
+            initial = Formset(instance=instance)
+            data = FormData(initial)
+            data.set_formset_field(initial, 2, 'language_code', 'de')
+            data.set_formset_field(initial, 2, 'translated_field', 'Deutsch')
+            data.set_formset_field(initial, 3, 'language_code', 'fr')
+            data.set_formset_field(initial, 3, 'translated_field', 'Français')
+
+            formset = Formset(data=data, instance=instance)
+            self.assertTrue(formset.is_valid())
+            with mock.patch.object(type(connection.features),
+                                   'can_return_rows_from_bulk_insert', can_return):
+                objs = formset.save()
+            self.assertEqual(len(objs), 2)
+            for obj in objs:
+                self.assertEqual(obj.pk, instance.translations.get(language_code=obj.language_code).pk)
+                obj.save()      # updates, does not insert again
+
+    def test_save_translations_hook(self):
+        instance = Normal.objects.language('en').get(pk=self.normal_id[1])
+        calls = []
+        class Formset(translationformset_factory(Normal, extra=1, exclude=[])):
+            def save_translations(self, translations):
+                calls.append(sorted(obj.language_code for obj in translations))
+                super().save_translations(translations)
+
+        initial = Formset(instance=instance)
+        data = FormData(initial)
+        data.set_formset_field(initial, 0, 'DELETE', 'DELETE')
+        data.set_formset_field(initial, 1, 'translated_field', 'updated_ja')
+        data.set_formset_field(initial, 2, 'language_code', 'de')
+        data.set_formset_field(initial, 2, 'translated_field', 'Deutsch')
+
+        formset = Formset(data=data, instance=instance)
+        self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertEqual(calls, [['de', 'ja']])
+        self.assertCountEqual(instance.translations.all_languages(), ('ja', 'de'))
+
+        # without commit, nothing is saved
+        initial = Formset(instance=instance)
+        data = FormData(initial)
+        data.set_formset_field(initial, 0, 'translated_field', 'not saved')
+        formset = Formset(data=data, instance=instance)
+        self.assertTrue(formset.is_valid())
+        with self.assertNumQueries(0):
+            objs = formset.save(commit=False)
+        self.assertEqual(len(objs), 1)
+        self.assertEqual(calls, [['de', 'ja']])
+
+    def test_save_custom_save(self):
+        # custom save() must see each translation loaded on the master object
+        instance = AutoPopulated.objects.language('en').create(translated_name='Apple fruit')
+        Formset = translationformset_factory(AutoPopulated, extra=1, exclude=[])
+
+        initial = Formset(instance=instance)
+        data = FormData(initial)
+        data.set_formset_field(initial, 1, 'language_code', 'ja')
+        data.set_formset_field(initial, 1, 'translated_name', 'Ringo fruit')
+
+        formset = Formset(data=data, instance=instance)
+        self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertCountEqual(
+            AutoPopulated.objects.language('all').filter(pk=instance.pk)
+                                 .values_list('language_code', 'slug'),
+            [('en', 'apple-fruit'), ('ja', 'ringo-fruit')]
+        )
+
+    def test_save_signals(self):
+        # signal receivers must see translations saved one by one
+        instance = Normal.objects.language('en').get(pk=self.normal_id[1])
+        Formset = translationformset_factory(Normal, extra=1, exclude=[])
+        saved = []
+        def receiver(sender, instance, created, **kwargs):
+            saved.append((instance.language_code, created))
+        trans_model = Normal._meta.translations_model
+        post_save.connect(receiver, sender=trans_model)
+        self.addCleanup(post_save.disconnect, receiver, sender=trans_model)
+
+        initial = Formset(instance=instance)
+        data = FormData(initial)
+        data.set_formset_field(initial, 0, 'translated_field', 'updated_en')
+        data.set_formset_field(initial, 2, 'language_code', 'de')
+        data.set_formset_field(initial, 2, 'translated_field', 'Deutsch')
+
+        formset = Formset(data=data, instance=instance)
+        self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertCountEqual(saved, [('en', False), ('de', True)])
+        self.assertCountEqual(instance.translations.all_languages(), ('en', 'ja', 'de'))
+
+
+class TestTranslationsInlineUnique(HvadTestCase):
+    def setUp(self):
+        self.object = Unique.objects.language('en').create(
+            shared_field='object', translated_field='object-en', unique_by_lang='object')
+        self.object.translate('ja')
+        self.object.translated_field = 'object-ja'
+        self.object.unique_by_lang = 'object'
+        self.object.save()
+        self.other = Unique.objects.language('en').create(
+            shared_field='other', translated_field='other-en', unique_by_lang='other')
+        self.Formset = translationformset_factory(Unique, extra=3, exclude=[])
+
+    def make_data(self, *rows):
+        initial = self.Formset(instance=self.object)
+        data = FormData(initial)
+        for index, row in enumerate(rows, 2):
+            for name, value in row.items():
+                data.set_formset_field(initial, index, name, value)
+        return data
+
+    def test_valid(self):
+        data = self.make_data(
+            {'language_code': 'de', 'translated_field': 'object-de', 'unique_by_lang': 'object'},
+            {'language_code': 'fr', 'translated_field': 'object-fr', 'unique_by_lang': 'other'},
+        )
+        formset = self.Formset(data=data, instance=self.object)
+        # formset queryset, existing translation of each initial form, then
+        # a single query per unique check
+        with self.assertNumQueries(5):
+            self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertCountEqual(self.object.translations.all_languages(), ('en', 'ja', 'de', 'fr'))
+
+    def test_database_conflicts(self):
+        data = self.make_data(
+            {'language_code': 'de', 'translated_field': 'other-en', 'unique_by_lang': 'object'},
+            {'language_code': 'fr', 'translated_field': 'object-fr', 'unique_by_lang': 'object'},
+            {'language_code': 'zh', 'translated_field': 'object-zh', 'unique_by_lang': 'zh'},
+        )
+        formset = self.Formset(data=data, instance=self.object)
+        with self.assertNumQueries(5):
+            self.assertFalse(formset.is_valid())
+        self.assertEqual(list(formset.forms[2].errors), ['translated_field'])
+        self.assertEqual(formset.forms[3].errors, {})
+        self.assertEqual(formset.forms[4].errors, {})
+
+        # existing translations are checked too, excluding themselves
+        initial = self.Formset(instance=self.object)
+        data = FormData(initial)
+        data.set_formset_field(initial, 0, 'unique_by_lang', 'other')
+        formset = self.Formset(data=data, instance=self.object)
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(list(formset.forms[0].errors), ['__all__'])
+        self.assertEqual(formset.forms[1].errors, {})
+
+    def test_duplicates(self):
+        data = self.make_data(
+            {'language_code': 'de', 'translated_field': 'object-de', 'unique_by_lang': 'de'},
+            {'language_code': 'fr', 'translated_field': 'object-de', 'unique_by_lang': 'fr'},
+            {'language_code': 'ja', 'translated_field': 'object-zh', 'unique_by_lang': 'zh'},
+        )
+        formset = self.Formset(data=data, instance=self.object)
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(formset.forms[2].errors, {})
+        self.assertEqual(list(formset.forms[3].errors), ['__all__'])
+        self.assertEqual(list(formset.forms[4].errors), ['__all__'])
+        self.assertEqual(len(formset.non_form_errors()), 2)
@@ -1,7 +1,20 @@
+import django
+from django.db import connection
+from django.db.models import Q
 from hvad.test_utils.testcase import HvadTestCase
 from hvad.test_utils.project.app.models import Normal
 from hvad.test_utils.fixtures import NormalFixture
 from hvad.exceptions import WrongManager
+from django.db.backends.signals import connection_created
+from hvad import collation
+from hvad.collation import check_collations, collated_index, register_collations
+from hvad.operations import CreateCollations
+from hvad.pagination import KeysetPaginator
+from unittest import mock, skipUnless
+
+# SQLite collations are only available with PyICU
+sorts_collated = skipUnless(connection.vendor != 'sqlite' or collation.icu is not None,
+                            'SQLite collations require PyICU')
 
 class OrderingTest(HvadTestCase, NormalFixture):
     normal_count = 2
@@ -131,3 +144,111 @@ class DefaultOrderingTest(HvadTestCase, NormalFixture):
         self.assertEqual(tuple(obj.pk for obj in qs),
                          tuple(reversed(tuple(self.normal_id.values()))))
         self.assertEqual(len(qs), self.normal_count)
+
+
+@skipUnless(django.VERSION >= (3, 2), 'Collations require Django 3.2')
+class CollationTest(HvadTestCase):
+    words = ('Zebra', 'été', 'apple', 'fa', 'eau')
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == 'postgresql':
+            with connection.schema_editor() as editor:
+                CreateCollations(['en', 'ja']).database_forwards('app', editor, None, None)
+        for word in self.words:
+            Normal.objects.language('en').create(shared_field=word, translated_field=word)
+
+    def test_binary_ordering(self):
+        qs = Normal.objects.language('en').order_by('translated_field')
+        self.assertEqual(qs.query.order_by, ('translated_field',))
+
+    @sorts_collated
+    def test_collated_ordering(self):
+        with self.settings(HVAD={'USE_COLLATIONS': True}):
+            qs = Normal.objects.language('en').order_by('translated_field')
+            self.assertEqual([obj.translated_field for obj in qs],
+                             ['apple', 'eau', 'été', 'fa', 'Zebra'])
+            qs = Normal.objects.language('en').order_by('-translated_field', 'shared_field')
+            self.assertEqual([obj.translated_field for obj in qs],
+                             ['Zebra', 'fa', 'été', 'eau', 'apple'])
+
+            # Collations are only used for a single language
+            qs = Normal.objects.language('en').fallbacks('ja').order_by('translated_field')
+            self.assertNotIn('COLLATE', str(qs.query))
+            qs = Normal.objects.language('all').order_by('translated_field')
+            self.assertNotIn('COLLATE', str(qs.query))
+
+    @sorts_collated
+    def test_language_rules(self):
+        languages = (('en', 'English'), ('de', 'German'), ('sv', 'Swedish'))
+        Normal.objects.language('en').filter(translated_field__in=self.words).delete()
+        for language, words in (('de', ('Zucker', 'Bär', 'Äpfel', 'Apfel')),
+                                ('sv', ('öl', 'zebra', 'ärt', 'åsna', 'apa'))):
+            for word in words:
+                Normal.objects.language(language).create(shared_field=word,
+                                                         translated_field=word)
+        with self.settings(HVAD={'USE_COLLATIONS': True, 'LANGUAGES': languages}):
+            if connection.vendor == 'postgresql':
+                with connection.schema_editor() as editor:
+                    CreateCollations(['de', 'sv']).database_forwards('app', editor, None, None)
+            qs = Normal.objects.language('de').order_by('translated_field')
+            self.assertEqual([obj.translated_field for obj in qs],
+                             ['Apfel', 'Äpfel', 'Bär', 'Zucker'])
+            qs = Normal.objects.language('sv').order_by('translated_field')
+            self.assertEqual([obj.translated_field for obj in qs],
+                             ['apa', 'zebra', 'åsna', 'ärt', 'öl'])
+
+    @sorts_collated
+    def test_unknown_language(self):
+        with self.settings(HVAD={'USE_COLLATIONS': True}):
+            Normal.objects.language('en').filter(translated_field__in=self.words).update(
+                language_code='sr')
+            qs = Normal.objects.language('sr').order_by('translated_field')
+            self.assertEqual([obj.translated_field for obj in qs],
+                             ['apple', 'eau', 'été', 'fa', 'Zebra'])
+
+    def test_registration(self):
+        def receivers():
+            return [receiver() for key, receiver in connection_created.receivers]
+        with self.settings(HVAD={'USE_COLLATIONS': False}):
+            self.assertNotIn(register_collations, receivers())
+        with self.settings(HVAD={'USE_COLLATIONS': True}):
+            self.assertIn(register_collations, receivers())
+
+    def test_without_icu(self):
+        with mock.patch.object(collation, 'icu', None):
+            with self.settings(HVAD={'USE_COLLATIONS': True}):
+                errors = check_collations(None)
+                qs = Normal.objects.language('en').order_by('translated_field')
+                query = str(qs.query)
+            with self.settings(HVAD={'USE_COLLATIONS': False}):
+                self.assertEqual(check_collations(None), [])
+        if connection.vendor == 'sqlite':
+            self.assertEqual([error.id for error in errors], ['hvad.collation.E01'])
+            self.assertNotIn('COLLATE', query)
+        else:
+            self.assertEqual(errors, [])
+
+    @sorts_collated
+    def test_collated_pagination(self):
+        with self.settings(HVAD={'USE_COLLATIONS': True}):
+            paginator = KeysetPaginator(Normal.objects.language('en'), per_page=2,
+                                        ordering=['translated_field'])
+            words, page = [], paginator.page()
+            while True:
+                words.extend(obj.translated_field for obj in page)
+                if not page.has_next():
+                    break
+                page = paginator.page(page.next_cursor)
+        self.assertEqual(words, ['apple', 'eau', 'été', 'fa', 'Zebra'])
+
+    def test_collated_index(self):
+        index = collated_index('translated_field', 'en', name='normal_collated_en')
+        self.assertEqual(index.condition, Q(language_code='en'))
+        self.assertEqual(index.expressions[0].collation, 'hvad_en')
+
+    def test_operation(self):
+        operation = CreateCollations(['en', 'ja'])
+        self.assertEqual(operation.deconstruct(),
+                         ('CreateCollations', [], {'languages': ['en', 'ja']}))
+        self.assertEqual(operation.describe(), 'Create collations for languages en, ja')
@@ -0,0 +1,114 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from hvad.test_utils.testcase import HvadTestCase
+from hvad.test_utils.project.app.models import Normal, Related
+from hvad.pagination import KeysetPaginator, InvalidCursor
+
+#===============================================================================
+
+class KeysetPaginatorTests(HvadTestCase):
+    # shared_field, english translation, japanese translation
+    data = (
+        ('s1', 'c', None),
+        ('s2', 'a', 'ja2'),
+        ('s3', 'b', 'ja3'),
+        ('s4', 'a', None),
+        ('s5', 'b', 'ja5'),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.ids = {}
+        for shared, english, japanese in self.data:
+            obj = Normal.objects.language('en').create(shared_field=shared,
+                                                       translated_field=english)
+            if japanese is not None:
+                obj.translate('ja')
+                obj.translated_field = japanese
+                obj.save()
+            self.ids[shared] = obj.pk
+
+    def walk(self, paginator):
+        """ Go through all pages forward then backward, return lists of shared fields """
+        forward, page = [], paginator.page()
+        while True:
+            forward.append([obj.shared_field for obj in page])
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        backward = [[obj.shared_field for obj in page]]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward.append([obj.shared_field for obj in page])
+        return forward, backward
+
+    def test_translated_ordering(self):
+        paginator = KeysetPaginator(Normal.objects.language('en'), 2,
+                                    ordering=['translated_field'])
+        forward, backward = self.walk(paginator)
+        self.assertEqual(forward, [['s2', 's4'], ['s3', 's5'], ['s1']])
+        self.assertEqual(backward, list(reversed(forward)))
+
+    def test_queryset_ordering(self):
+        qs = Normal.objects.language('en').order_by('-translated_field', 'shared_field')
+        forward, backward = self.walk(KeysetPaginator(qs, 2))
+        self.assertEqual(forward, [['s1', 's3'], ['s5', 's2'], ['s4']])
+        self.assertEqual(backward, list(reversed(forward)))
+
+        qs = Normal.objects.language('en').order_by('-shared_field')
+        forward, backward = self.walk(KeysetPaginator(qs, 3))
+        self.assertEqual(forward, [['s5', 's4', 's3'], ['s2', 's1']])
+        self.assertEqual(backward, list(reversed(forward)))
+
+    def test_shared_name(self):
+        for name, expected in (('master__shared_field', 'shared_field'),
+                               ('-master__shared_field', '-shared_field'),
+                               ('-translated_field', '-translated_field'),
+                               ('normal__master__shared_field', 'normal__master__shared_field'),
+                               ('master', 'master')):
+            self.assertEqual(KeysetPaginator._shared_name(name), expected)
+
+    def test_default_ordering(self):
+        forward, backward = self.walk(KeysetPaginator(Normal.objects.language('en'), 2))
+        self.assertEqual(forward, [['s1', 's2'], ['s3', 's4'], ['s5']])
+        self.assertEqual(backward, list(reversed(forward)))
+
+    def test_fallbacks(self):
+        qs = Normal.objects.language('ja').fallbacks('en')
+        paginator = KeysetPaginator(qs, 2, ordering=['translated_field'])
+        forward, backward = self.walk(paginator)
+        self.assertEqual(forward, [['s4', 's1'], ['s2', 's3'], ['s5']])
+        self.assertEqual(backward, list(reversed(forward)))
+
+    def test_page(self):
+        paginator = KeysetPaginator(Normal.objects.language('en'), 2,
+                                    ordering='-translated_field')
+        with self.assertNumQueries(1):
+            page = paginator.page()
+        self.assertEqual(len(page), 2)
+        self.assertEqual(page[0].translated_field, 'c')
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_other_pages())
+        self.assertIsNone(page.previous_cursor)
+
+        with CaptureQueriesContext(connection) as ctx:
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+        self.assertEqual([obj.shared_field for obj in page], ['s3', 's4'])
+        self.assertTrue(page.has_previous())
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, KeysetPaginator, Normal.objects.untranslated(), 2)
+        self.assertRaises(ValueError, KeysetPaginator, Normal.objects.language('all'), 2)
+        self.assertRaises(ValueError, KeysetPaginator, Normal.objects.language('en'), 0)
+        self.assertRaises(ValueError, KeysetPaginator, Normal.objects.language('en'), 2,
+                          ordering=['master__shared_field'])
+        for name in ('normal', 'translated'):
+            self.assertRaises(ValueError, KeysetPaginator, Related.objects.language('en'), 2,
+                              ordering=[name])
+
+        paginator = KeysetPaginator(Normal.objects.language('en'), 2)
+        for cursor in ('garbage', 'e30=', 'eyJrIjpbMSwyXSwiciI6MH0=', 'eyJrIjpbIngiXSwiciI6MH0='):
+            self.assertRaises(InvalidCursor, paginator.page, cursor)
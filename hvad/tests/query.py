@@ -1,11 +1,18 @@
-from django.db import connection
-from django.db.models import Count
+from django.core.cache import cache
+from django.db import NotSupportedError, connection
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat
 from django.db.models.query_utils import Q
 from django.utils import translation
+from hvad.models import NoTranslation
+from hvad.search import search_config
 from hvad.test_utils.data import NORMAL, STANDARD
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, AggregateModel, Standard, SimpleRelated
+from hvad.test_utils.project.app.models import (Normal, AggregateModel, Standard, SimpleRelated,
+                                               AutoPopulated, CompactLanguage)
 from hvad.test_utils.fixtures import NormalFixture, StandardFixture
+from unittest import skipIf, skipUnless
 
 class FilterTests(HvadTestCase, NormalFixture):
     normal_count = 2
@@ -86,6 +93,45 @@ class FilterTests(HvadTestCase, NormalFixture):
             self.assertEqual(obj2.translated_field, NORMAL[2].translated_field['en'])
 
 
+class FallbacksCountTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    def setUp(self):
+        super().setUp()
+        (Normal.objects.language('en')
+                       .filter(pk=self.normal_id[1])
+                       .delete_translations())
+
+    def test_count_shared_filter(self):
+        qs = Normal.objects.language('en').fallbacks('ja')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(qs.count(), self.normal_count)
+            self.assertEqual(qs.filter(shared_field=NORMAL[1].shared_field).count(), 1)
+            self.assertEqual(qs.filter(pk=self.normal_id[2]).count(), 1)
+            self.assertTrue(qs.filter(pk=self.normal_id[1]).exists())
+            self.assertFalse(qs.filter(shared_field='nonexistent').exists())
+        for query in context.captured_queries:
+            self.assertNotIn('CASE', query['sql'])
+
+    def test_count_untranslated(self):
+        Normal(shared_field='untranslated', language_code=NoTranslation).save()
+        qs = Normal.objects.language('en').fallbacks('ja')
+        self.assertEqual(qs.count(), self.normal_count)
+        self.assertFalse(qs.filter(shared_field='untranslated').exists())
+
+    def test_count_translated_filter(self):
+        # Object 2 has a better English translation, so it must not match
+        qs = (Normal.objects.language('en').fallbacks('ja')
+                            .filter(translated_field__in=(NORMAL[1].translated_field['ja'],
+                                                          NORMAL[2].translated_field['ja'])))
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(qs.count(), 1)
+            self.assertTrue(qs.exists())
+        for query in context.captured_queries:
+            self.assertIn('CASE', query['sql'])
+        self.assertEqual(len(qs), 1)
+
+
 class ExtraTests(HvadTestCase, NormalFixture):
     normal_count = 2
 
@@ -181,7 +227,7 @@ class UpdateTests(HvadTestCase, NormalFixture):
         n2 = Normal.objects.language('en').get(pk=self.normal_id[2])
         ja1 = Normal.objects.language('ja').get(pk=self.normal_id[1])
         ja2 = Normal.objects.language('ja').get(pk=self.normal_id[2])
-        with self.assertNumQueries(1 if connection.features.update_can_self_select else 2):
+        with self.assertNumQueries(1):
             Normal.objects.language('en').update(shared_field=NEW_SHARED)
         new1 = Normal.objects.language('en').get(pk=self.normal_id[1])
         new2 = Normal.objects.language('en').get(pk=self.normal_id[2])
@@ -223,7 +269,7 @@ class UpdateTests(HvadTestCase, NormalFixture):
         NEW_TRANSLATED = 'new translated'
         ja1 = Normal.objects.language('ja').get(pk=self.normal_id[1])
         ja2 = Normal.objects.language('ja').get(pk=self.normal_id[2])
-        with self.assertNumQueries(2 if connection.features.update_can_self_select else 3):
+        with self.assertNumQueries(2):
             Normal.objects.language('en').update(
                 shared_field=NEW_SHARED, translated_field=NEW_TRANSLATED
             )
@@ -241,6 +287,44 @@ class UpdateTests(HvadTestCase, NormalFixture):
         self.assertEqual(newja1.translated_field, ja1.translated_field)
         self.assertEqual(newja2.translated_field, ja2.translated_field)
 
+    def test_update_joined(self):
+        NEW_SHARED = 'new shared'
+        NEW_TRANSLATED = 'new translated'
+        with self.assertNumQueries(2):
+            count = (Normal.objects.language('ja')
+                                   .filter(shared_field=NORMAL[1].shared_field)
+                                   .update(shared_field=NEW_SHARED,
+                                           translated_field=NEW_TRANSLATED))
+        self.assertEqual(count, 2)
+        obj = Normal.objects.language('ja').get(pk=self.normal_id[1])
+        self.assertEqual(obj.shared_field, NEW_SHARED)
+        self.assertEqual(obj.translated_field, NEW_TRANSLATED)
+        obj = Normal.objects.language('en').get(pk=self.normal_id[1])
+        self.assertEqual(obj.translated_field, NORMAL[1].translated_field['en'])
+        obj = Normal.objects.language('ja').get(pk=self.normal_id[2])
+        self.assertEqual(obj.shared_field, NORMAL[2].shared_field)
+        self.assertEqual(obj.translated_field, NORMAL[2].translated_field['ja'])
+
+    def test_update_fallbacks(self):
+        NEW_TRANSLATED = 'new translated'
+        (Normal.objects.language('en')
+                       .filter(pk=self.normal_id[1])
+                       .delete_translations())
+        count = Normal.objects.language('en').fallbacks('ja').update(translated_field=NEW_TRANSLATED)
+        self.assertEqual(count, self.normal_count)
+        self.assertEqual(Normal.objects.language('ja').get(pk=self.normal_id[1]).translated_field,
+                         NEW_TRANSLATED)
+        self.assertEqual(Normal.objects.language('en').get(pk=self.normal_id[2]).translated_field,
+                         NEW_TRANSLATED)
+        self.assertEqual(Normal.objects.language('ja').get(pk=self.normal_id[2]).translated_field,
+                         NORMAL[2].translated_field['ja'])
+
+    def test_update_expression(self):
+        Normal.objects.language('en').update(shared_field=Concat(F('shared_field'), Value('!')))
+        for index in (1, 2):
+            obj = Normal.objects.language('ja').get(pk=self.normal_id[index])
+            self.assertEqual(obj.shared_field, NORMAL[index].shared_field + '!')
+
     def test_update_deferred_language(self):
         NEW_TRANSLATED = 'new translated'
         n1 = Normal.objects.language('en').get(pk=self.normal_id[1])
@@ -477,6 +561,193 @@ class InBulkTests(HvadTestCase, NormalFixture):
             self.assertEqual(result[pk1].language_code, 'en')
 
 
+class ResolveTests(HvadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.apple = AutoPopulated.objects.language('en').create(translated_name='Apple')
+        self.apple.translate('ja')
+        self.apple.translated_name = 'Ringo'
+        self.apple.save()
+        self.pear = AutoPopulated.objects.language('ja').create(translated_name='Nashi')
+        cache.clear()
+
+    def test_resolve_preferred(self):
+        with self.assertNumQueries(1):
+            obj, language, trans = AutoPopulated.objects.language('en').resolve(slug='apple')
+            self.assertEqual(obj.pk, self.apple.pk)
+            self.assertEqual(language, 'en')
+            self.assertEqual(trans.language_code, 'en')
+            self.assertEqual(obj.translated_name, 'Apple')
+
+    def test_resolve_other_language(self):
+        with self.assertNumQueries(1):
+            obj, language, trans = AutoPopulated.objects.language('en').resolve(slug='ringo')
+            self.assertEqual(obj.pk, self.apple.pk)
+            self.assertEqual(language, 'ja')
+            self.assertEqual(trans.slug, 'apple')
+            self.assertEqual(obj.translated_name, 'Apple')
+
+        with self.assertNumQueries(1):
+            obj, language, trans = AutoPopulated.objects.language('en').resolve(slug='nashi')
+            self.assertEqual(obj.pk, self.pear.pk)
+            self.assertEqual(language, 'ja')
+            self.assertIsNone(trans)
+            self.assertEqual(obj.translated_name, 'Nashi')
+
+        obj, language, trans = (AutoPopulated.objects.language('en').fallbacks('ja')
+                                                     .resolve(slug='nashi'))
+        self.assertEqual(language, 'ja')
+        self.assertEqual(trans.language_code, 'ja')
+
+    def test_resolve_filtered(self):
+        qs = AutoPopulated.objects.language('en').exclude(pk=self.apple.pk)
+        self.assertRaises(AutoPopulated.DoesNotExist, qs.resolve, slug='ringo')
+        self.assertRaises(AutoPopulated.DoesNotExist,
+                          AutoPopulated.objects.language('en').resolve, slug='banana')
+        self.assertRaises(ValueError, AutoPopulated.objects.language('all').resolve, slug='apple')
+
+    def test_resolve_translated_filter(self):
+        # translations excluded by the queryset's filters do not match
+        obj = AutoPopulated.objects.language('en').create(translated_name='Same')
+        obj.translate('ja')
+        obj.translated_name = 'Other'
+        obj.slug = 'same'
+        obj.save()
+        qs = AutoPopulated.objects.language('ja').filter(translated_name='Same')
+        obj, language, trans = qs.resolve(slug='same')
+        self.assertEqual(language, 'en')
+        self.assertEqual(trans.language_code, 'ja')
+
+        qs = AutoPopulated.objects.language('ja').filter(translated_name='Nothing')
+        self.assertRaises(AutoPopulated.DoesNotExist, qs.resolve, slug='same')
+
+    def test_resolve_ambiguous(self):
+        AutoPopulated.objects.language('ja').create(translated_name='Apple')
+        obj, language, trans = AutoPopulated.objects.language('en').resolve(slug='apple')
+        self.assertEqual((obj.pk, language), (self.apple.pk, 'en'))
+        self.assertRaises(AutoPopulated.MultipleObjectsReturned,
+                          AutoPopulated.objects.language('fr').resolve, slug='apple')
+
+    def test_resolve_cached(self):
+        qs = AutoPopulated.objects.language('en')
+        with self.assertNumQueries(1):
+            obj, language, trans = qs.resolve(cache_timeout=60, slug='ringo')
+        with self.assertNumQueries(0):
+            cached = qs.resolve(cache_timeout=60, slug='ringo')
+        self.assertEqual(cached.object.pk, obj.pk)
+        self.assertEqual(cached.language_code, 'ja')
+        self.assertEqual(cached.object.translated_name, 'Apple')
+        with self.assertNumQueries(1):
+            qs.resolve(cache_timeout=60, slug='apple')
+
+
+class SearchConfigTests(HvadTestCase):
+    def test_search_config(self):
+        self.assertEqual(search_config('en'), 'english')
+        self.assertEqual(search_config('en-us'), 'english')
+        self.assertEqual(search_config('ja'), 'simple')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search requires PostgreSQL')
+class SearchTests(HvadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.both = Normal.objects.language('en').create(shared_field='both',
+                                                         translated_field='green apple')
+        self.both.translate('ja')
+        self.both.translated_field = 'red apple'
+        self.both.save()
+        self.english = Normal.objects.language('en').create(shared_field='english',
+                                                            translated_field='red wine')
+
+    def test_search(self):
+        with self.assertNumQueries(1):
+            qs = Normal.objects.language('en').search('apple')
+            self.assertEqual([obj.shared_field for obj in qs], ['both'])
+        qs = Normal.objects.language('ja').search('red apple')
+        self.assertEqual([(obj.shared_field, obj.translated_field) for obj in qs],
+                         [('both', 'red apple')])
+        self.assertEqual(Normal.objects.language('en').search('').count(), 0)
+        self.assertEqual(Normal.objects.language('en').search('apple', fields=['shared_field'])
+                                                      .count(), 0)
+
+    def test_search_fallbacks(self):
+        qs = Normal.objects.language('ja').fallbacks('en').search('red').order_by('shared_field')
+        self.assertEqual([(obj.shared_field, obj.language_code) for obj in qs],
+                         [('both', 'ja'), ('english', 'en')])
+        # Only the translation objects are loaded in is searched
+        qs = Normal.objects.language('ja').fallbacks('en').search('green')
+        self.assertEqual(qs.count(), 0)
+
+    def test_search_all(self):
+        qs = Normal.objects.language('all').search('apple').order_by('language_code')
+        self.assertEqual([obj.language_code for obj in qs], ['en', 'ja'])
+
+    def test_search_rank(self):
+        qs = (Normal.objects.language('en').search('red wine', rank='rank')
+                            .filter(rank__gt=0).order_by('-rank'))
+        self.assertEqual([obj.shared_field for obj in qs], ['english'])
+        self.assertGreater(qs[0].rank, 0)
+
+
+@skipIf(connection.vendor == 'postgresql', 'Full-text search is supported on PostgreSQL')
+class SearchNotSupportedTests(HvadTestCase):
+    def test_search(self):
+        with self.assertNumQueries(0):
+            with self.assertRaises(NotSupportedError):
+                Normal.objects.language('en').search('apple')
+
+
+class AvailableLanguagesTests(HvadTestCase, NormalFixture):
+    normal_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.english = Normal.objects.language('en').create(shared_field='english',
+                                                            translated_field='English')
+
+    def test_available_languages(self):
+        with self.assertNumQueries(1):
+            result = Normal.objects.language('en').available_languages()
+        self.assertEqual(result, {
+            self.normal_id[1]: frozenset(['en', 'ja']),
+            self.normal_id[2]: frozenset(['en', 'ja']),
+            self.english.pk: frozenset(['en']),
+        })
+        with self.assertNumQueries(1):
+            result = Normal.objects.language('ja').fallbacks('en').available_languages()
+        self.assertEqual(set(result), {self.normal_id[1], self.normal_id[2], self.english.pk})
+        with self.assertNumQueries(1):
+            result = (Normal.objects.language('ja').filter(shared_field='Shared1')
+                                                   .available_languages())
+        self.assertEqual(result, {self.normal_id[1]: frozenset(['en', 'ja'])})
+        result = Normal.objects.language('en').order_by('shared_field')[:1].available_languages()
+        self.assertEqual(list(result), [self.normal_id[1]])
+
+    def test_cache(self):
+        qs = Normal.objects.language('en').order_by('pk')
+        objs = list(qs)
+        with self.assertNumQueries(1):
+            qs.available_languages()
+        with self.assertNumQueries(0):
+            self.assertEqual([obj.translations.all_languages() for obj in objs],
+                             [{'en', 'ja'}, {'en', 'ja'}, {'en'}])
+
+        obj = objs[2]
+        obj.translate('ja')
+        obj.translated_field = 'Japanese'
+        obj.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(obj.translations.all_languages(), {'en', 'ja'})
+
+    def test_compact_language_code(self):
+        obj = CompactLanguage.objects.language('en').create(shared_field='s',
+                                                            translated_field='t')
+        with self.assertNumQueries(1):
+            result = CompactLanguage.objects.language('en').available_languages()
+        self.assertEqual(result, {obj.pk: frozenset(['en'])})
+
+
 class DeleteTests(HvadTestCase, NormalFixture):
     normal_count = 2
 
@@ -517,6 +788,29 @@ class DeleteTests(HvadTestCase, NormalFixture):
         self.assertEqual(Normal.objects.language('ja').count(), 2)
         self.assertEqual(Normal.objects.language('en').count(), 0)
 
+    def test_chunked_delete_translation(self):
+        progress = []
+        with self.assertNumQueries(4):
+            deleted = Normal.objects.language('all').delete_translations(
+                chunk_size=3, progress=progress.append)
+        self.assertEqual(deleted, 4)
+        self.assertEqual(progress, [3, 4])
+        self.assertEqual(Normal.objects.untranslated().count(), 2)
+        self.assertEqual(Normal._meta.translations_model.objects.count(), 0)
+
+    def test_chunked_delete_fallbacks(self):
+        # Each object must lose exactly one translation, even though deleting it
+        # makes the other one the best fallback
+        deleted = (Normal.objects.language('en').fallbacks('ja')
+                                 .delete_translations(chunk_size=1))
+        self.assertEqual(deleted, self.normal_count)
+        self.assertEqual(Normal.objects.language('en').count(), 0)
+        self.assertEqual(Normal.objects.language('ja').count(), self.normal_count)
+
+    def test_chunked_delete_invalid(self):
+        with self.assertRaises(ValueError):
+            Normal.objects.language('en').delete_translations(chunk_size=0)
+
     def test_delete_fallbacks(self):
         qs = Normal.objects.language().fallbacks()
         qs.filter(shared_field=NORMAL[1].shared_field).delete()
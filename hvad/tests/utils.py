@@ -1,6 +1,6 @@
 from django.utils import translation
 from hvad.utils import (translation_rater, get_cached_translation, set_cached_translation,
-                        get_translation, load_translation)
+                        get_translation, load_translation, load_translations)
 from hvad.test_utils.data import NORMAL
 from hvad.test_utils.fixtures import NormalFixture
 from hvad.test_utils.testcase import HvadTestCase
@@ -132,3 +132,23 @@ class TranslationAccessorTests(HvadTestCase, NormalFixture):
             translation = load_translation(obj, 'sr', enforce=True)
             self.assertIs(translation.pk, None)
             self.assertEqual(translation.language_code, 'sr')
+
+    def test_load_translations_current_language(self):
+        # no language given, current language is used for loading and creating
+        Normal._meta.translations_model.objects.filter(master_id=self.normal_id[1],
+                                                       language_code='ja').delete()
+        objs = list(Normal.objects.untranslated().filter(pk=self.normal_id[1]))
+        objs.append(Normal(shared_field='new'))
+        set_cached_translation(objs[1], None)
+        with translation.override('ja'), self.assertNumQueries(1):
+            load_translations(objs, None)
+        for obj in objs:
+            translation_obj = get_cached_translation(obj)
+            self.assertIs(translation_obj.pk, None)
+            self.assertEqual(translation_obj.language_code, 'ja')
+
+        objs = list(Normal.objects.untranslated().filter(pk=self.normal_id[1]))
+        with translation.override('en'), self.assertNumQueries(1):
+            load_translations(objs, None)
+        self.assertEqual(get_cached_translation(objs[0]).translated_field,
+                         NORMAL[1].translated_field['en'])
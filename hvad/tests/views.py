@@ -130,6 +130,28 @@ class CreateViewTests(HvadTestCase):
         response = CustomFormView.as_view()(request)
         self.assertEqual(response.status_code, 302)
 
+    def test_form_class_cache(self):
+        'Form classes are built once per model, language and form'
+        def get_form_class(view_class, language):
+            view = view_class()
+            view.setup(self.request_factory.get('/url/?language=%s' % language))
+            return view.get_form_class()
+
+        Form = get_form_class(TestCreateView, 'en')
+        self.assertEqual(Form.language, 'en')
+        self.assertIs(get_form_class(TestCreateView, 'en'), Form)
+        self.assertIs(get_form_class(TestUpdateView, 'en'), Form)
+        self.assertIsNot(get_form_class(TestCreateView, 'ja'), Form)
+        self.assertEqual(get_form_class(TestCreateView, 'ja').language, 'ja')
+
+        class CustomFormView(TestCreateView):
+            class form_class(TranslatableModelForm):
+                additional = forms.CharField(max_length=250)
+        CustomForm = get_form_class(CustomFormView, 'en')
+        self.assertIsNot(CustomForm, Form)
+        self.assertIn('additional', CustomForm.base_fields)
+        self.assertIs(get_form_class(CustomFormView, 'en'), CustomForm)
+
 class UpdateViewTests(HvadTestCase, NormalFixture):
     normal_count = 2
 
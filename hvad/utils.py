@@ -2,6 +2,7 @@
     Mostly intended for internal use and third-party modules.
 """
 import django
+from django.db.models import Model, signals
 from django.utils.translation import get_language
 from hvad.exceptions import WrongManager
 from hvad.settings import hvad_settings
@@ -66,6 +67,56 @@ def set_cached_translation(instance, translation):
         hvad_query.set_cached_value(instance, translation)
     return previous
 
+def get_cached_languages(instance):
+    """ Get the languages cached onto instance by available_languages(), as a
+        frozenset, or None if they are not cached.
+        Intended for internal use and third-party modules.
+    """
+    return instance.__dict__.get('_hvad_languages')
+
+def set_cached_languages(instance, languages):
+    """ Sets the languages cached onto instance, used by all_languages().
+        Intended for internal use and third-party modules.
+        - Passing None unsets the languages cache
+    """
+    if languages is None:
+        instance.__dict__.pop('_hvad_languages', None)
+    else:
+        instance.__dict__['_hvad_languages'] = frozenset(languages)
+
+def get_language_bitmap_field(model):
+    """ Return the LanguageBitmapField of a translatable model, or None """
+    return getattr(model._meta.concrete_model._meta, 'language_bitmap_field', None)
+
+def bulk_create_translations(master, translations):
+    """ Insert new translations of master with a single query. Backends that
+        cannot return rows from bulk inserts leave primary keys unset, they
+        are then loaded with another query, by language.
+    """
+    manager = master._meta.translations_model._base_manager.db_manager(master._state.db)
+    manager.bulk_create(translations)
+    if any(translation.pk is None for translation in translations):
+        pks = dict(manager.filter(master=master,
+                                  language_code__in=[obj.language_code for obj in translations])
+                          .values_list('language_code', 'pk'))
+        for translation in translations:
+            translation.pk = pks[translation.language_code]
+    return translations
+
+def has_custom_save(model):
+    """ Tell whether saving instances of a translatable model runs user code:
+        a save() override on the model or its translations model, or pre_save
+        or post_save receivers on either. Translations of such models must be
+        saved one at a time through the combined model rather than in batch.
+    """
+    from hvad.models import TranslatableModel
+    trans_model = model._meta.translations_model
+    return (model.save is not TranslatableModel.save or
+            trans_model.save is not Model.save or
+            any(signal.has_listeners(sender)
+                for signal in (signals.pre_save, signals.post_save)
+                for sender in (model, trans_model)))
+
 def get_translation(instance, language_code=None):
     ''' Get translation by language. Fresh copy is loaded from DB.
         Can leverage prefetched data, like in .prefetch_related('translations')
@@ -103,6 +154,38 @@ def load_translation(instance, language, enforce=False):
                 translation = trans_model(language_code=language)
     return translation
 
+def load_translations(instances, language, enforce=False):
+    ''' Batch version of load_translation, for instances of a single model.
+        Caches on each instance the translation load_translation would return,
+        loading those not in prefetched data with a single query.
+    '''
+    language = language or get_language()
+    pending = {}
+    for instance in instances:
+        translation = get_cached_translation(instance)
+        if translation is None or (enforce and translation.language_code != language):
+            accessor = getattr(instance, instance._meta.translations_accessor)
+            if instance.pk is None or accessor.all()._result_cache is not None:
+                set_cached_translation(instance, load_translation(instance, language, enforce))
+            else:
+                pending.setdefault(instance.pk, []).append(instance)
+    if not pending:
+        return
+
+    first = next(iter(pending.values()))[0]
+    trans_model = first._meta.translations_model
+    qs = trans_model._default_manager.db_manager(first._state.db).filter(
+        master__in=pending.keys(), language_code=language)
+    translations = {obj.master_id: obj for obj in qs}
+    for pk, objs in pending.items():
+        for instance in objs:
+            translation = translations.get(pk)
+            if translation is None:
+                translation = trans_model(language_code=language)
+            else:
+                translation.master = instance
+            set_cached_translation(instance, translation)
+
 #=============================================================================
 
 class SmartGetField:
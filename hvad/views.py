@@ -4,7 +4,7 @@
 from django.views.generic.detail import SingleObjectTemplateResponseMixin
 from django.views.generic.edit import ModelFormMixin, ProcessFormView, BaseDeleteView
 from django.utils.translation import get_language
-from hvad.forms import translatable_modelform_factory
+from hvad.forms import translatable_modelform_factory, FormClassCache, form_class_cache
 
 __all__ = ('TranslatableCreateView', 'TranslatableUpdateView', 'TranslatableDeleteView')
 
@@ -33,7 +33,10 @@ class TranslatableModelFormMixin(ModelFormMixin):
         kwargs = {}
         if self.form_class is not None:
             kwargs['form'] = self.form_class
-        return translatable_modelform_factory(self.get_language(), model, **kwargs)
+        language = self.get_language()
+        key = FormClassCache.make_key(model, language, kwargs)
+        return form_class_cache.get(
+            key, lambda: translatable_modelform_factory(language, model, **kwargs))
 
 #=============================================================================
 